@@ -1,9 +1,50 @@
+from functools import cached_property
+import json
+import os
 from pathlib import Path
 import re
 from textwrap import dedent
+from typing import Iterable, Iterator
+
+from dto_inference import DtoInferrer, DtoMapper
+from kotlin_syntax import import_block, indent_lines, region, string_literal
+from options import RATE_LIMIT_PROFILES, SAMPLE_ENDPOINTS, SELECTORS, ScaffoldOptions
+from profiling import TimingHook, timed
+from repo_index import get_repo_index
+from templates import template
+from kotlin_parser import VISIBILITY_MODIFIERS, Member, Parameter
+from lockfile import get_lockfile
+from theme_index import ThemeIndex, find_class_parameters, get_theme_index
+from translator import get_translator
+from writer import IncrementalWriter, Writer
+
+SETTINGS_KEY = (True, "setupPreferenceScreen")
 
 
 class AnimeSourceScaffolder:
+    kind = "anime"
+    # Rate limit profile used when none is given, None means no client override.
+    default_rate_limit: str | None = None
+    # (package, factory, source) used by multi-language modules.
+    source_factory = ("eu.kanade.tachiyomi.animesource", "AnimeSourceFactory", "AnimeSource")
+    configurable_source = "eu.kanade.tachiyomi.animesource.ConfigurableAnimeSource"
+
+    # Vocabulary used to translate the (anime) templates to this source type.
+    replace_map: tuple[tuple[str, str], ...] = ()
+
+    # Per-source values, filled when rendering an already compiled template.
+    template_slots = (
+        "package_line",
+        "package_id",
+        "className",
+        "name",
+        "lang",
+        "baseUrl",
+        "host",
+        "theme",
+        "theme_pkg",
+    )
+
     def __init__(
         self,
         is_parsed: bool,
@@ -11,11 +52,19 @@ class AnimeSourceScaffolder:
         lang: str,
         baseUrl: str,
         theme: str | None = None,
+        options: ScaffoldOptions | None = None,
+        repo_root: str | Path = ".",
+        timing_hooks: Iterable[TimingHook] = (),
     ):
+        self.options = options or ScaffoldOptions()
+        # Called with the timing event of every phase of this source only.
+        self.timing_hooks = tuple(timing_hooks)
+        # Every lookup and write is relative to it, never to the process cwd.
+        self.repo_root = Path(repo_root).resolve()
         self.theme = theme
         self.theme_pkg: str | None = None
         if theme is not None:
-            if not Path("lib-multisrc").exists():
+            if not (self.repo_root / "lib-multisrc").exists():
                 raise Exception(
                     "lib-multisrc support is required in the project for scaffolding extensions with a theme."
                 )
@@ -28,49 +77,124 @@ class AnimeSourceScaffolder:
         self.package = self.className.lower()
         self.is_parsed = is_parsed
         self.name = name
-        self.lang = lang
-        if "-" in lang:
+        # en,es,pt-BR -> a single "all" module with a source per language.
+        self.languages = tuple(dict.fromkeys(filter(None, map(str.strip, lang.split(",")))))
+        if not self.languages:
+            raise Exception("At least one language is required.")
+        self.lang = "all" if self.is_multi_lang else self.languages[0]
+        if "-" in self.lang:
             # en-US -> en, pt-BR -> pt
-            self.short_lang = lang[: lang.find("-")]
+            self.short_lang = self.lang[: self.lang.find("-")]
         else:
-            self.short_lang = lang
+            self.short_lang = self.lang
 
         self.baseUrl = baseUrl.strip("/")
+        self.host = self.baseUrl.replace("https://", "", 1)
 
         self.package_path = f"src/{self.short_lang}/{self.package}"
         self.package_id = f"{self.short_lang}.{self.package}"
         self.package_line = (
             f"package eu.kanade.tachiyomi.animeextension.{self.package_id}"
         )
+        if self.options.sample_json and (is_parsed or theme is not None):
+            raise Exception("Sample JSON responses are only supported by HttpSource-based sources.")
+        if self.options.selectors and (not is_parsed or theme is not None):
+            raise Exception("Selectors are only supported by ParsedHttpSource-based sources.")
+
         self.resources_path = f"{self.package_path}/res"
         self.sources_path = f"{self.package_path}/src/eu/kanade/tachiyomi/animeextension/{self.short_lang}/{self.package}"
+        # Whether create_dirs took the module in the repo index.
+        self.reserved = False
 
-    def create_dirs(self):
-        try:
-            Path(self.sources_path).mkdir(parents=True)
-            Path(self.resources_path).mkdir(parents=True)
-        except:
-            pass
-
-    def create_files(self):
-        files = (
-            (f"{self.package_path}/build.gradle", self.build_gradle),
-            (f"{self.sources_path}/{self.className}.kt", self.default_class),
-        )
+    @property
+    def is_multi_lang(self) -> bool:
+        return len(self.languages) > 1
+
+    def timed(self, phase: str, **fields):
+        return timed(self.timing_hooks, phase, self.package_path, **fields)
+
+    def translate(self, text: str) -> str:
+        return get_translator(self.replace_map)(text)
+
+    @property
+    def template_variant(self) -> tuple:
+        # Everything that changes the structure of the generated files.
+        return (self.is_parsed, self.theme is None, self.options, self.is_multi_lang)
+
+    @property
+    def dirs(self) -> tuple[str, ...]:
+        return (self.sources_path, self.resources_path)
+
+    def create_dirs(self, writer: Writer | None = None, force: bool = False):
+        with self.timed("create_dirs"):
+            writer = writer or IncrementalWriter(root=self.repo_root)
+            if not force:
+                index = get_repo_index(self.repo_root)
+                if writer.persistent:
+                    index.reserve(self)
+                    self.reserved = True
+                else:
+                    # Dry runs and archives still report conflicts, but don't take the module.
+                    index.check(self)
+            for directory in self.dirs:
+                writer.mkdir(directory)
+
+    def release(self):
+        # Undoes create_dirs after a failed create_files, so a retry isn't refused.
+        if not self.reserved:
+            return
+        self.reserved = False
+        get_repo_index(self.repo_root).release(self)
+        # The module didn't exist before, remove the directories if nothing was written.
+        for directory, _, _ in os.walk(self.repo_root / self.package_path, topdown=False):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def plan(self) -> Iterator[tuple[str, str]]:
+        # Lazy: each file is only rendered when the caller reaches it.
+        yield f"{self.package_path}/build.gradle", self.build_gradle
+        yield f"{self.sources_path}/{self.className}.kt", self.default_class
+        if self.is_multi_lang:
+            yield f"{self.sources_path}/{self.className}Factory.kt", self.factory_source
+
+        if self.options.sample_json:
+            yield f"{self.sources_path}/{self.className}Dto.kt", self.dto_file
+        if self.options.request_timing:
+            yield f"{self.sources_path}/RequestTiming.kt", self.request_timing_listener
 
         if self.theme is None:
-            files += (
-                (f"{self.package_path}/AndroidManifest.xml", self.android_manifest),
-                (
-                    f"{self.sources_path}/{self.className}UrlActivity.kt",
-                    self.url_handler,
-                ),
-            )
+            yield f"{self.package_path}/AndroidManifest.xml", self.android_manifest
+            yield f"{self.sources_path}/{self.className}UrlActivity.kt", self.url_handler
+
+    @property
+    def files(self) -> tuple[tuple[str, str], ...]:
+        return tuple(self.plan())
 
-        for file, content in files:
-            print(f"Creating {file}")
-            with open(file, "w+", encoding="utf-8") as f:
-                f.write(content)
+    def create_files(
+        self,
+        files: Iterable[tuple[str, str]] | None = None,
+        writer: Writer | None = None,
+    ) -> dict[str, str]:
+        # path -> created/updated/unchanged, the totals are in writer.report.
+        writer = writer or IncrementalWriter(root=self.repo_root)
+        statuses = {}
+        written = []
+        try:
+            # Everything is rendered before the first write, so a failing template
+            # (unknown theme, parse error) doesn't leave a partial module behind.
+            files = tuple(files or self.plan())
+            for file, content in files:
+                with self.timed("write", path=str(file), bytes=len(content)) as event:
+                    event["status"] = statuses[str(file)] = writer.write(file, content)
+                written.append((str(file), content))
+        except Exception:
+            self.release()
+            raise
+        if writer.persistent:
+            get_lockfile(self.repo_root).record(self, written)
+        return statuses
 
     @property
     def default_class(self):
@@ -81,9 +205,8 @@ class AnimeSourceScaffolder:
         else:
             return self.http_source
 
-    @property
+    @template
     def android_manifest(self) -> str:
-        host = self.baseUrl.replace("https://", "", 1)
         return dedent(
             f"""
         <?xml version="1.0" encoding="utf-8"?>
@@ -101,7 +224,7 @@ class AnimeSourceScaffolder:
                         <category android:name="android.intent.category.BROWSABLE" />
 
                         <data
-                            android:host="{host}"
+                            android:host="{self.host}"
                             android:pathPattern="/anime/..*"
                             android:scheme="https" />
                     </intent-filter>
@@ -111,13 +234,13 @@ class AnimeSourceScaffolder:
         """[1:]
         )
 
-    @property
+    @template
     def build_gradle(self) -> str:
         return dedent(
             f"""
         ext {{
             extName = '{self.name}'
-            extClass = '.{self.className}'
+            extClass = '.{self.className}{"Factory" if self.is_multi_lang else ""}'
             {"extVersionCode = 1" if self.theme is None else f''' themePkg = '{self.theme_pkg}'
             baseUrl = '{self.baseUrl}'
             overrideVersionCode = 0'''[1:]}
@@ -129,60 +252,435 @@ class AnimeSourceScaffolder:
 
     @property
     def theme_source(self) -> str:
+        with self.timed("theme_source", theme=self.theme):
+            return self._theme_source()
+
+    def _theme_source(self) -> str:
         if self.theme is not None:
-            class_path = Path(
-                f"lib-multisrc/{self.theme_pkg}/src/eu/kanade/tachiyomi/multisrc/{self.theme_pkg}/{self.theme}.kt"
-            )
-            if not class_path.exists():
+            with self.timed("theme_index", theme=self.theme):
+                theme = self.theme_index.get(self.theme)
+            if theme is None:
+                class_path = self.repo_root / (
+                    f"lib-multisrc/{self.theme_pkg}/src/eu/kanade/tachiyomi/multisrc/{self.theme_pkg}/{self.theme}.kt"
+                )
                 raise Exception(
                     f"{self.theme} class does not exist! searched in {class_path}."
                 )
 
-            arguments = self._get_class_arguments(class_path.read_text())
+            if theme.parameters is None:
+                raise Exception(f"Could not parse {self.theme} ({theme.path}): {theme.error}")
+            with self.timed("class_arguments", theme=self.theme):
+                arguments = self._fill_class_arguments(theme.parameters)
 
             return self._theme_class(arguments)
         else:
             raise Exception("Wtf, that's not supposed to happen.")
 
     def _get_class_arguments(self, class_body: str) -> str:
-        args = re.search(
-            rf"class {self.theme}\((.*?)\) :", class_body, re.MULTILINE | re.DOTALL
-        )
-        if args is None or not args.group(1):
+        with self.timed("_get_class_arguments", theme=self.theme, bytes=len(class_body)):
+            return self._fill_class_arguments(find_class_parameters(self.theme, class_body))
+
+    @property
+    def known_arguments(self) -> dict[str, str]:
+        # Theme constructor parameters filled by the scaffolder.
+        return {
+            "name": f'"{self.name}"',
+            "baseUrl": f'"{self.baseUrl}"',
+            "lang": "lang" if self.is_multi_lang else f'"{self.lang}"',
+        }
+
+    def _fill_class_arguments(self, parameters: list[Parameter]) -> str:
+        if not parameters:
             return ""
 
-        def replace_arg(item: re.Match) -> str:
-            var_name = item.group(1)
-            match var_name:
+        known = self.known_arguments
+        lines = []
+        for parameter in parameters:
+            if parameter.name in known:
                 # Replace known variables.
-                case "name" | "baseUrl" | "lang":
-                    return f'"{self.__getattribute__(var_name)}"'
-                # Comment-out protected/private/unknown ones.
-                case _:
-                    return "// " + item.group(0)
-
-        args_text = re.sub(
-            r"(?:final )?(?:[a-z]+)? val (\w+): \w+",
-            replace_arg,
-            args.group(1),
-        )
-        return args_text
+                lines.append(f"{parameter.name} = {known[parameter.name]},")
+            else:
+                # Comment-out the unknown ones.
+                lines.append(f"// {parameter.declaration()},")
+        return "\n" + indent_lines(lines, " " * 4) + "\n"
+
+    @property
+    def theme_imports(self) -> set[str]:
+        return {
+            f"eu.kanade.tachiyomi.multisrc.{self.theme_pkg}.{self.theme}",
+            *self.client_imports,
+            *self.settings_imports,
+            *(name for member in self.abstract_members for name in member.imports),
+        }
+
+    @property
+    def theme_index(self) -> ThemeIndex:
+        return get_theme_index(self.repo_root)
+
+    @property
+    def abstract_members(self) -> list[Member]:
+        # Still abstract along the theme chain, so they need an override.
+        members = self.theme_index.abstract_members(self.theme)
+        if self.options.request_timing:
+            # Replaced by the settings screen with the timing preference.
+            return [member for member in members if member.key != SETTINGS_KEY]
+        return members
+
+    def _override_stub(self, member: Member) -> list[str]:
+        modifiers = [
+            modifier
+            for modifier in member.modifiers
+            if modifier not in VISIBILITY_MODIFIERS and modifier not in ("abstract", "open", "override")
+        ]
+        declaration = " ".join(["override", *modifiers, member.declaration])
+        if member.kind == "fun":
+            return [declaration + " {", "    throw UnsupportedOperationException()", "}"]
+        lines = [declaration, "    get() = throw UnsupportedOperationException()"]
+        if member.kind == "var":
+            lines.append("    set(value) = throw UnsupportedOperationException()")
+        return lines
 
     def _theme_class(self, args: str) -> str:
-        return (
+        head = (
             dedent(
                 f"""
         {self.package_line}
 
-        import eu.kanade.tachiyomi.multisrc.{self.theme_pkg}.{self.theme}
+{import_block(self.theme_imports, " " * 8)}
 
-        class {self.className} : {self.theme}
+        {self.class_declaration("lang: String")} : {self.theme}
         """[1:]
             )[:-1]
-            + f"({args})\n"
+            + f"({args}){self.source_interfaces}"
+        )
+        sections = [
+            region("client", self.client_lines),
+            *map(self._override_stub, self.abstract_members),
+            self.settings_lines,
+        ]
+        companion = [line for lines in (self.timing_companion_lines, self.shared_client_lines) for line in ["", *lines] if lines][1:]
+        if companion:
+            sections.append(["companion object {", *("    " + line if line else line for line in companion), "}"])
+        body = [line for section in filter(None, sections) for line in ["", *section]][1:]
+        if not body:
+            return head + "\n"
+        return head + " {\n" + indent_lines(body, " " * 4) + "\n}\n"
+
+    @property
+    def client_calls(self) -> list[str]:
+        options = self.options
+        calls = []
+        if options.disk_cache:
+            calls.append(
+                f'.cache(Cache(File(Injekt.get<Application>().cacheDir, "network_cache_{self.package_id}"), {options.disk_cache}L * 1024 * 1024))'
+            )
+        if options.connection_pool or options.keep_alive:
+            calls.append(
+                f".connectionPool(ConnectionPool({options.connection_pool or 5}, {options.keep_alive or 300}L, TimeUnit.SECONDS))"
+            )
+        rate_limit = options.rate_limit or self.default_rate_limit
+        if rate_limit is None and options.cdn_hosts:
+            rate_limit = "default"
+        if rate_limit is not None:
+            site_limit, cdn_limit = RATE_LIMIT_PROFILES[rate_limit]
+            # The shared client lives in the companion, without access to baseUrl.
+            base_url = f'"{self.baseUrl}"' if self.is_multi_lang else "baseUrl"
+            calls.append(f".rateLimitHost({base_url}.toHttpUrl(), {site_limit})")
+            for host in options.cdn_hosts:
+                url = host if "://" in host else f"https://{host}"
+                calls.append(f".rateLimitHost({string_literal(url)}.toHttpUrl(), {cdn_limit})")
+
+        return calls
+
+    @property
+    def client_lines(self) -> list[str]:
+        calls = self.client_calls
+        base = "network.client"
+        if self.is_multi_lang and calls:
+            # Per-source calls go on a builder of the shared client, which keeps its pool and rate limiters.
+            calls, base = [], "sharedClient"
+        if self.options.request_timing:
+            calls.append(
+                f'.apply {{ if (REQUEST_TIMING) eventListenerFactory(RequestTiming("{self.className}", ::requestTimingEnabled)) }}'
+            )
+        if not calls:
+            return [] if base == "network.client" else [f"override val client = {base}"]
+        return [
+            f"override val client = {base}.newBuilder()",
+            *("    " + call for call in calls),
+            "    .build()",
+        ]
+
+    @property
+    def source_interfaces(self) -> str:
+        if not self.options.request_timing:
+            return ""
+        # A theme with its own settings screen is configurable already.
+        if self.theme is not None and self.theme_index.declares(self.theme, SETTINGS_KEY):
+            return ""
+        return ", " + self.configurable_source.rpartition(".")[2]
+
+    @property
+    def settings_lines(self) -> list[str]:
+        if not self.options.request_timing:
+            return []
+        # Only call the theme's screen when it is implemented (not stubbed).
+        calls_super = (
+            self.theme is not None
+            and self.theme_index.declares(self.theme, SETTINGS_KEY)
+            and all(member.key != SETTINGS_KEY for member in self.theme_index.abstract_members(self.theme))
         )
+        return [
+            "private val timingPreferences by lazy {",
+            '    Injekt.get<Application>().getSharedPreferences("source_$id", 0x0000)',
+            "}",
+            "",
+            "private fun requestTimingEnabled() = timingPreferences.getBoolean(PREF_REQUEST_TIMING_KEY, false)",
+            "",
+            "override fun setupPreferenceScreen(screen: PreferenceScreen) {",
+            *(["    super.setupPreferenceScreen(screen)", ""] if calls_super else []),
+            "    if (REQUEST_TIMING) {",
+            "        SwitchPreferenceCompat(screen.context).apply {",
+            "            key = PREF_REQUEST_TIMING_KEY",
+            '            title = "Log request timings"',
+            '            summary = "Logs the DNS, connect, TTFB and body timings of every request to logcat."',
+            "            setDefaultValue(false)",
+            "        }.also(screen::addPreference)",
+            "    }",
+            "}",
+        ]
 
     @property
+    def settings(self) -> str:
+        if not self.settings_lines:
+            return ""
+        return (
+            "            // ============================== Settings ==============================\n"
+            + indent_lines(self.settings_lines, " " * 12)
+            + "\n\n"
+        )
+
+    @property
+    def settings_imports(self) -> set[str]:
+        if not self.options.request_timing:
+            return set()
+        imports = {
+            "android.app.Application",
+            "androidx.preference.PreferenceScreen",
+            "androidx.preference.SwitchPreferenceCompat",
+            "uy.kohesive.injekt.Injekt",
+            "uy.kohesive.injekt.api.get",
+        }
+        if self.source_interfaces:
+            imports.add(self.configurable_source)
+        return imports
+
+    @property
+    def timing_companion_lines(self) -> list[str]:
+        if not self.options.request_timing:
+            return []
+        return [
+            "// false compiles the request timing listener and its preference away.",
+            "private const val REQUEST_TIMING = true",
+            'private const val PREF_REQUEST_TIMING_KEY = "pref_request_timing"',
+        ]
+
+    @template
+    def request_timing_listener(self) -> str:
+        # Not translated: the categories match both anime and manga method names.
+        return f"{self.package_line}\n\n" + dedent(
+            """
+            import android.util.Log
+            import okhttp3.Call
+            import okhttp3.EventListener
+            import okhttp3.Protocol
+            import java.io.IOException
+            import java.net.InetAddress
+            import java.net.InetSocketAddress
+            import java.net.Proxy
+
+            // Logs the DNS/connect/TTFB/body timings of every call, by endpoint category,
+            // while `enabled` returns true. Nothing is traced otherwise.
+            class RequestTiming(
+                tag: String,
+                private val enabled: () -> Boolean,
+            ) : EventListener.Factory {
+                private val tag = tag.take(23)
+
+                override fun create(call: Call): EventListener =
+                    if (enabled()) CallTimer(category()) else EventListener.NONE
+
+                // Calls are created synchronously, so the source method that made
+                // this one (getPopularAnime, fetchChapterList, ...) is on the stack.
+                private fun category(): String {
+                    for (frame in Thread.currentThread().stackTrace) {
+                        val method = frame.className.substringAfter('$', "") + frame.methodName
+                        CATEGORIES.firstOrNull { (marker, _) -> marker in method }?.let { return it.second }
+                    }
+                    return "other"
+                }
+
+                private inner class CallTimer(private val category: String) : EventListener() {
+                    private val callStart = System.nanoTime()
+                    private var dnsStart = 0L
+                    private var dns: Long? = null
+                    private var connectStart = 0L
+                    private var connect: Long? = null
+                    private var requestStart = 0L
+                    private var ttfb: Long? = null
+                    private var bodyStart = 0L
+                    private var body: Long? = null
+                    private var bytes = 0L
+
+                    override fun dnsStart(call: Call, domainName: String) {
+                        dnsStart = System.nanoTime()
+                    }
+
+                    override fun dnsEnd(call: Call, domainName: String, inetAddressList: List<InetAddress>) {
+                        dns = System.nanoTime() - dnsStart
+                    }
+
+                    override fun connectStart(call: Call, inetSocketAddress: InetSocketAddress, proxy: Proxy) {
+                        connectStart = System.nanoTime()
+                    }
+
+                    override fun connectEnd(call: Call, inetSocketAddress: InetSocketAddress, proxy: Proxy, protocol: Protocol?) {
+                        connect = System.nanoTime() - connectStart
+                    }
+
+                    override fun requestHeadersStart(call: Call) {
+                        requestStart = System.nanoTime()
+                    }
+
+                    override fun responseHeadersStart(call: Call) {
+                        ttfb = System.nanoTime() - requestStart
+                    }
+
+                    override fun responseBodyStart(call: Call) {
+                        bodyStart = System.nanoTime()
+                    }
+
+                    override fun responseBodyEnd(call: Call, byteCount: Long) {
+                        body = System.nanoTime() - bodyStart
+                        bytes = byteCount
+                    }
+
+                    override fun callEnd(call: Call) = log(call, null)
+
+                    override fun callFailed(call: Call, ioe: IOException) = log(call, ioe)
+
+                    private fun log(call: Call, error: IOException?) {
+                        val request = call.request()
+                        Log.d(
+                            tag,
+                            "$category ${request.method} ${request.url.encodedPath}: " +
+                                "dns=${ms(dns)} connect=${ms(connect)} ttfb=${ms(ttfb)} body=${ms(body)} ($bytes B) " +
+                                "total=${ms(System.nanoTime() - callStart)}" +
+                                (error?.let { " failed: $it" } ?: ""),
+                        )
+                    }
+                }
+
+                companion object {
+                    // Checked in order against the method names on the stack.
+                    private val CATEGORIES = listOf(
+                        "Popular" to "popular",
+                        "Latest" to "latest",
+                        "Search" to "search",
+                        "Details" to "details",
+                        "EpisodeList" to "episodes",
+                        "ChapterList" to "chapters",
+                        "VideoList" to "videos",
+                        "Hoster" to "videos",
+                        "PageList" to "pages",
+                        "ImageUrl" to "pages",
+                    )
+
+                    private fun ms(nanos: Long?) = nanos?.let { "${it / 1_000_000}ms" } ?: "-"
+                }
+            }
+            """
+        )[1:]
+
+    @property
+    def shared_client_lines(self) -> list[str]:
+        calls = self.client_calls
+        if not self.is_multi_lang or not calls:
+            return []
+        return [
+            "// Built once and shared by every language: one connection pool and rate limit budget.",
+            "private val sharedClient by lazy {",
+            "    Injekt.get<NetworkHelper>().client.newBuilder()",
+            *("        " + call for call in calls),
+            "        .build()",
+            "}",
+        ]
+
+    def class_declaration(self, lang_parameter: str = "override val lang: String") -> str:
+        if self.is_multi_lang:
+            return f"open class {self.className}({lang_parameter})"
+        return f"class {self.className}"
+
+    @property
+    def lang_property(self) -> str:
+        if self.is_multi_lang:
+            return ""
+        return f'            override val lang = "{self.lang}"\n\n'
+
+    @property
+    def factory_source(self) -> str:
+        subclasses = {
+            lang: self.className + "".join(part[:1].upper() + part[1:].lower() for part in re.split("[-_]", lang))
+            for lang in self.languages
+        }
+        package, factory, source = self.source_factory
+        sources = "\n".join(f"        {subclass}()," for subclass in subclasses.values())
+        classes = "\n\n".join(f'class {subclass} : {self.className}("{lang}")' for lang, subclass in subclasses.items())
+        return (
+            f"{self.package_line}\n\n"
+            f"{import_block([f'{package}.{factory}', f'{package}.{source}'])}\n\n"
+            f"class {self.className}Factory : {factory} {{\n"
+            f"    override fun createSources(): List<{source}> = listOf(\n{sources}\n    )\n"
+            f"}}\n\n{classes}\n"
+        )
+
+
+    @property
+    def client_imports(self) -> set[str]:
+        options = self.options
+        imports = set()
+        if options.disk_cache:
+            imports |= {
+                "android.app.Application",
+                "java.io.File",
+                "okhttp3.Cache",
+                "uy.kohesive.injekt.Injekt",
+                "uy.kohesive.injekt.api.get",
+            }
+        if options.connection_pool or options.keep_alive:
+            imports |= {"java.util.concurrent.TimeUnit", "okhttp3.ConnectionPool"}
+        if options.rate_limit or self.default_rate_limit or options.cdn_hosts:
+            imports |= {
+                "eu.kanade.tachiyomi.network.interceptor.rateLimitHost",
+                "okhttp3.HttpUrl.Companion.toHttpUrl",
+            }
+        if self.options.request_timing:
+            imports |= self.settings_imports
+        if self.shared_client_lines:
+            imports |= {
+                "eu.kanade.tachiyomi.network.NetworkHelper",
+                "uy.kohesive.injekt.Injekt",
+                "uy.kohesive.injekt.api.get",
+            }
+        return imports
+
+    @template
+    def client_override(self) -> str:
+        if not self.client_lines:
+            return ""
+        return indent_lines(region("client", self.client_lines), " " * 12) + "\n\n"
+
+    @template
     def http_source_screens(self) -> str:
         return f"""
             // ============================== Popular ===============================
@@ -191,7 +689,7 @@ class AnimeSourceScaffolder:
             }}
 
             override fun popularAnimeParse(response: Response): AnimesPage {{
-                throw UnsupportedOperationException()
+                {self._parse_stub("popular")}
             }}
 
             // =============================== Latest ===============================
@@ -200,81 +698,156 @@ class AnimeSourceScaffolder:
             }}
 
             override fun latestUpdatesParse(response: Response): AnimesPage {{
-                throw UnsupportedOperationException()
+                {self._parse_stub("latest")}
             }}
 
             // =============================== Search ===============================
+            // region scaffolder:search-by-id
 {self.url_handler_search}
+            // endregion
 
             override fun searchAnimeRequest(page: Int, query: String, filters: AnimeFilterList): Request {{
                 throw UnsupportedOperationException()
             }}
 
             override fun searchAnimeParse(response: Response): AnimesPage {{
-                throw UnsupportedOperationException()
+                {self._parse_stub("search")}
             }}
 
             // =========================== Anime Details ============================
             override fun animeDetailsParse(response: Response): SAnime {{
-                throw UnsupportedOperationException()
+                {self._parse_stub("details")}
             }}
 
             // ============================== Episodes ==============================
-            override fun episodeListParse(response: Response): List<SEpisode> {{
-                throw UnsupportedOperationException()
+{self.episode_list_fetch}            override fun episodeListParse(response: Response): List<SEpisode> {{
+                {"return episodeListPageParse(response).episodes" if self.options.paginated_episodes else self._parse_stub("episodes")}
             }}"""[1:]
 
-    @property
+    @template
     def http_source_catalogues(self) -> str:
-        return """
+        return f"""
             // ============================ Video Links =============================
-            override fun videoListRequest(episode: SEpisode): Request {
+{self.concurrent_video_list}            override fun videoListRequest(episode: SEpisode): Request {{
                 throw UnsupportedOperationException()
-            }
+            }}
 
-            override fun videoListParse(response: Response): List<Video> {
+            override fun videoListParse(response: Response): List<Video> {{
                 throw UnsupportedOperationException()
-            }"""[1:]
+            }}{self.video_sort}"""[1:]
 
     @property
+    def http_source_imports(self) -> set[str]:
+        return {
+            "eu.kanade.tachiyomi.animesource.model.AnimeFilterList",
+            "eu.kanade.tachiyomi.animesource.model.AnimesPage",
+            "eu.kanade.tachiyomi.animesource.model.SAnime",
+            "eu.kanade.tachiyomi.animesource.model.SEpisode",
+            "eu.kanade.tachiyomi.animesource.model.Video",
+            "eu.kanade.tachiyomi.animesource.online.AnimeHttpSource",
+            "eu.kanade.tachiyomi.network.GET",
+            "eu.kanade.tachiyomi.network.awaitSuccess",
+            "okhttp3.Request",
+            "okhttp3.Response",
+            *self.client_imports,
+            *self.video_list_imports,
+            *self.episode_list_imports,
+            *(self.json_imports if self.options.sample_json else ()),
+        }
+
+    @property
+    def video_list_imports(self) -> set[str]:
+        if not self.concurrent_hosters:
+            return set()
+        return {
+            "android.util.Log",
+            "kotlinx.coroutines.Dispatchers",
+            "kotlinx.coroutines.async",
+            "kotlinx.coroutines.awaitAll",
+            "kotlinx.coroutines.coroutineScope",
+            "kotlinx.coroutines.withTimeout",
+        }
+
+    @property
+    def json_imports(self) -> set[str]:
+        return {
+            "kotlinx.serialization.json.Json",
+            "kotlinx.serialization.json.decodeFromStream",
+            "uy.kohesive.injekt.injectLazy",
+        }
+
+    @property
+    def json_property(self) -> str:
+        return "            private val json: Json by injectLazy()\n\n"
+
+    @property
+    def parse_as_helper(self) -> str:
+        return """
+            // ============================= Utilities ==============================
+            private inline fun <reified T> Response.parseAs(): T = use {
+                json.decodeFromStream(it.body.byteStream())
+            }
+
+"""[1:]
+
+    @cached_property
+    def dtos(self) -> tuple[dict[str, str], DtoInferrer]:
+        inferrer = DtoInferrer()
+        types = {
+            endpoint: inferrer.add(self.translate(SAMPLE_ENDPOINTS[endpoint]), json.loads(sample))
+            for endpoint, sample in self.options.sample_json
+        }
+        return types, inferrer
+
+    @cached_property
+    def dto_parsers(self) -> tuple[dict[str, str], DtoMapper]:
+        # endpoint -> expression parsing its response into the model.
+        types, inferrer = self.dtos
+        mapper = DtoMapper(inferrer, self.translate)
+        parsers = {endpoint: mapper.parse(endpoint, dto) for endpoint, dto in types.items()}
+        return {endpoint: parser for endpoint, parser in parsers.items() if parser is not None}, mapper
+
+    def _parse_stub(self, endpoint: str) -> str:
+        parser = self.dto_parsers[0].get(endpoint)
+        if parser is None:
+            return "throw UnsupportedOperationException()"
+        return f"return {parser}"
+
+    @template
+    def dto_file(self) -> str:
+        inferrer = self.dtos[1]
+        mapper = self.dto_parsers[1]
+        model_package = self.source_factory[0] + ".model"
+        imports = {*inferrer.imports, *(f"{model_package}.{self.translate(model)}" for model in mapper.models)}
+        declarations = "\n\n".join(filter(None, (inferrer.render(), mapper.render())))
+        return f"{self.package_line}\n\n{import_block(imports)}\n\n{declarations}\n"
+
+    @template
     def http_source(self) -> str:
         return dedent(
             f"""
         {self.package_line}
 
-        import eu.kanade.tachiyomi.animesource.model.AnimeFilterList
-        import eu.kanade.tachiyomi.animesource.model.AnimesPage
-        import eu.kanade.tachiyomi.animesource.model.SAnime
-        import eu.kanade.tachiyomi.animesource.model.SEpisode
-        import eu.kanade.tachiyomi.animesource.model.Video
-        import eu.kanade.tachiyomi.animesource.online.AnimeHttpSource
-        import eu.kanade.tachiyomi.network.GET
-        import eu.kanade.tachiyomi.network.awaitSuccess
-        import okhttp3.Request
-        import okhttp3.Response
+{import_block(self.http_source_imports, " " * 8)}
 
-        class {self.className} : AnimeHttpSource() {{
+        {self.class_declaration()} : AnimeHttpSource(){self.source_interfaces} {{
 
             override val name = "{self.name}"
 
             override val baseUrl = "{self.baseUrl}"
 
-            override val lang = "{self.lang}"
-
-            override val supportsLatest = false
+{self.lang_property}            override val supportsLatest = false
 
-{self.http_source_screens}
+{self.client_override}{self.json_property if self.options.sample_json else ""}{self.http_source_screens}
 
 {self.http_source_catalogues}
 
-            companion object {{
-                const val PREFIX_SEARCH = "id:"
-            }}
+{self.settings}{self.parse_as_helper if self.options.sample_json else ""}{self.companion_object}
         }}
         """[1:]
         )
 
-    @property
+    @template
     def parsed_http_source_screens(self) -> str:
         return f"""
             // ============================== Popular ===============================
@@ -282,8 +855,8 @@ class AnimeSourceScaffolder:
                 throw UnsupportedOperationException()
             }}
 
-            override fun popularAnimeSelector(): String {{
-                throw UnsupportedOperationException()
+{self._page_parse("popular")}            override fun popularAnimeSelector(): String {{
+                {self._selector_body("popular")}
             }}
 
             override fun popularAnimeFromElement(element: Element): SAnime {{
@@ -291,7 +864,7 @@ class AnimeSourceScaffolder:
             }}
 
             override fun popularAnimeNextPageSelector(): String? {{
-                throw UnsupportedOperationException()
+                {self._selector_body("popular_next")}
             }}
 
             // =============================== Latest ===============================
@@ -299,8 +872,8 @@ class AnimeSourceScaffolder:
                 throw UnsupportedOperationException()
             }}
 
-            override fun latestUpdatesSelector(): String {{
-                throw UnsupportedOperationException()
+{self._page_parse("latest")}            override fun latestUpdatesSelector(): String {{
+                {self._selector_body("latest")}
             }}
 
             override fun latestUpdatesFromElement(element: Element): SAnime {{
@@ -308,18 +881,20 @@ class AnimeSourceScaffolder:
             }}
 
             override fun latestUpdatesNextPageSelector(): String? {{
-                throw UnsupportedOperationException()
+                {self._selector_body("latest_next")}
             }}
 
             // =============================== Search ===============================
+            // region scaffolder:search-by-id
 {self.url_handler_search}
+            // endregion
 
             override fun searchAnimeRequest(page: Int, query: String, filters: AnimeFilterList): Request {{
                 throw UnsupportedOperationException()
             }}
 
-            override fun searchAnimeSelector(): String {{
-                throw UnsupportedOperationException()
+{self._page_parse("search")}            override fun searchAnimeSelector(): String {{
+                {self._selector_body("search")}
             }}
 
             override fun searchAnimeFromElement(element: Element): SAnime {{
@@ -327,7 +902,7 @@ class AnimeSourceScaffolder:
             }}
 
             override fun searchAnimeNextPageSelector(): String? {{
-                throw UnsupportedOperationException()
+                {self._selector_body("search_next")}
             }}
 
             // =========================== Anime Details ============================
@@ -336,76 +911,318 @@ class AnimeSourceScaffolder:
             }}
 
             // ============================== Episodes ==============================
-            override fun episodeListSelector(): String {{
-                throw UnsupportedOperationException()
+{self.episode_list_fetch}{self._list_parse("episodes", "episode")}            override fun episodeListSelector(): String {{
+                {self._selector_body("episodes")}
             }}
 
             override fun episodeFromElement(element: Element): SEpisode {{
                 throw UnsupportedOperationException()
             }}"""[1:]
 
-    @property
+    @template
     def parsed_http_source_catalogues(self) -> str:
-        return """
+        return f"""
             // ============================ Video Links =============================
-            override fun videoListParse(response: Response): List<Video> {
+{self.concurrent_video_list}            override fun videoListParse(response: Response): List<Video> {{
+                {f"return response.asJsoup().select({self._evaluator('videos')}).map(::videoFromElement)" if "videos" in self.selectors else "throw UnsupportedOperationException()"}
+            }}
+
+            override fun videoListSelector(): String {{
+                {self._selector_body("videos")}
+            }}
+
+            override fun videoFromElement(element: Element): Video {{
                 throw UnsupportedOperationException()
-            }
+            }}
 
-            override fun videoListSelector(): String {
+            override fun videoUrlParse(document: Document): String {{
                 throw UnsupportedOperationException()
+            }}{self.video_sort}"""[1:]
+
+    @property
+    def selectors(self) -> dict[str, str]:
+        return dict(self.options.selectors)
+
+    def _selector_name(self, key: str) -> str:
+        # popularAnime -> POPULAR_ANIME (POPULAR_MANGA for manga sources).
+        return re.sub(r"(?<!^)(?=[A-Z])", "_", self.translate(SELECTORS[key])).upper()
+
+    def _evaluator(self, key: str) -> str:
+        # Precompiled evaluator when the selector is known, the selector method otherwise.
+        if key in self.selectors:
+            return self._selector_name(key) + "_EVALUATOR"
+        return SELECTORS[key] + "Selector()"
+
+    def _selector_body(self, key: str) -> str:
+        if key in self.selectors:
+            return f"return {self._selector_name(key)}_SELECTOR"
+        return "throw UnsupportedOperationException()"
+
+    def _page_parse(self, key: str) -> str:
+        if key not in self.selectors and f"{key}_next" not in self.selectors:
+            return ""
+        screen = SELECTORS[key]
+        if f"{key}_next" in self.selectors:
+            next_page = f"document.selectFirst({self._evaluator(key + '_next')})"
+        else:
+            next_page = f"{screen}NextPageSelector()?.let(document::selectFirst)"
+        return f"""
+            override fun {screen}Parse(response: Response): AnimesPage {{
+                val document = response.asJsoup()
+                val animes = document.select({self._evaluator(key)}).map(::{screen}FromElement)
+                val hasNextPage = {next_page} != null
+                return AnimesPage(animes, hasNextPage)
+            }}
+
+"""[1:]
+
+    def _list_parse(self, key: str, item: str) -> str:
+        if key not in self.selectors or self.options.paginated_episodes:
+            return ""
+        model = "S" + item.capitalize()
+        return f"""
+            override fun {item}ListParse(response: Response): List<{model}> {{
+                return response.asJsoup().select({self._evaluator(key)}).map(::{item}FromElement)
+            }}
+
+"""[1:]
+
+    @property
+    def selector_imports(self) -> set[str]:
+        if not self.selectors:
+            return set()
+        return {"org.jsoup.select.QueryParser"}
+
+    @property
+    def episode_list_fetch(self) -> str:
+        return self.paginated_episode_list
+
+    @property
+    def paginated_episode_list(self) -> str:
+        if not self.options.paginated_episodes:
+            return ""
+        if self.is_parsed:
+            parse_page = f"""
+            private fun episodeListPageParse(document: Document) = EpisodeListPage(
+                document.select({self._evaluator("episodes")}).map(::episodeFromElement),
+                document.selectFirst(episodeListLastPageSelector())?.text()?.toIntOrNull() ?: 1,
+            )
+
+            private fun episodeListLastPageSelector(): String {{
+                throw UnsupportedOperationException()
+            }}"""
+        else:
+            parse_page = f"""
+            private fun episodeListPageParse(response: Response): EpisodeListPage {{
+                {self._parse_stub("episodes")}
+            }}"""
+        return self.paginated_episode_list_fetch + f"""
+            private fun episodeListPageRequest(anime: SAnime, page: Int): Request {{
+                throw UnsupportedOperationException()
+            }}
+{parse_page}
+
+            private data class EpisodeListPage(val episodes: List<SEpisode>, val lastPage: Int)
+
+"""[1:]
+
+    @property
+    def paginated_episode_list_fetch(self) -> str:
+        use = " { episodeListPageParse(it.asJsoup()) }" if self.is_parsed else "(::episodeListPageParse)"
+        return f"""
+            override suspend fun getEpisodeList(anime: SAnime): List<SEpisode> = coroutineScope {{
+                val firstPage = client.newCall(episodeListRequest(anime))
+                    .awaitSuccess()
+                    .use{use}
+
+                // The remaining pages are fetched concurrently (still within the client's
+                // rate limit), then merged back in page order.
+                val permits = Semaphore(LIST_PAGE_CONCURRENCY)
+                val otherPages = (2..firstPage.lastPage).map {{ page ->
+                    async {{
+                        permits.withPermit {{
+                            client.newCall(episodeListPageRequest(anime, page))
+                                .awaitSuccess()
+                                .use{use}
+                        }}
+                    }}
+                }}.awaitAll()
+
+                (listOf(firstPage) + otherPages).flatMap {{ it.episodes }}
+            }}
+
+"""[1:]
+
+    @property
+    def episode_list_imports(self) -> set[str]:
+        if not self.options.paginated_episodes:
+            return set()
+        return {
+            "eu.kanade.tachiyomi.network.awaitSuccess",
+            "kotlinx.coroutines.async",
+            "kotlinx.coroutines.awaitAll",
+            "kotlinx.coroutines.coroutineScope",
+            "kotlinx.coroutines.sync.Semaphore",
+            "kotlinx.coroutines.sync.withPermit",
+        }
+
+    @property
+    def concurrent_hosters(self) -> bool:
+        return self.options.concurrent_hosters
+
+    @property
+    def concurrent_video_list(self) -> str:
+        if not self.concurrent_hosters:
+            return ""
+        return """
+            override suspend fun getVideoList(episode: SEpisode): List<Video> = coroutineScope {
+                val hosters = client.newCall(videoListRequest(episode))
+                    .awaitSuccess()
+                    .use(::hosterListParse)
+
+                // Every hoster is resolved in parallel, a slow or broken one only loses its own videos.
+                hosters.map { hoster ->
+                    async(Dispatchers.IO) {
+                        runCatching {
+                            withTimeout(HOSTER_TIMEOUT) { videosFromHoster(hoster) }
+                        }.getOrElse {
+                            Log.e(name, "Failed to get videos from $hoster", it)
+                            emptyList()
+                        }
+                    }
+                }.awaitAll().flatten().sort()
             }
 
-            override fun videoFromElement(element: Element): Video {
+            private fun hosterListParse(response: Response): List<String> {
                 throw UnsupportedOperationException()
             }
 
-            override fun videoUrlParse(document: Document): String {
+            private suspend fun videosFromHoster(hoster: String): List<Video> {
                 throw UnsupportedOperationException()
-            }"""[1:]
+            }
+
+"""[1:]
+
+    @property
+    def video_sort(self) -> str:
+        if not self.concurrent_hosters:
+            return ""
+        comparators = []
+        if self.options.preferred_quality:
+            comparators.append("Descending<Video> { it.quality.contains(PREFERRED_QUALITY, true) }")
+        if self.options.preferred_hosters:
+            comparators.append(
+                "<Video> { video ->\n"
+                "                        PREFERRED_HOSTERS.indexOfFirst { video.quality.contains(it, true) }\n"
+                "                            .takeIf { it >= 0 } ?: Int.MAX_VALUE\n"
+                "                    }"
+            )
+        comparators.append(
+            "Descending<Video> { QUALITY_REGEX.find(it.quality)?.groupValues?.get(1)?.toIntOrNull() ?: 0 }"
+        )
+        chain = "compareBy" + comparators[0]
+        for comparator in comparators[1:]:
+            chain += "\n                        .thenBy" + comparator.replace("\n", "\n    ")
+        return f"""
+
+            override fun List<Video>.sort(): List<Video> {{
+                return sortedWith(
+                    {chain},
+                )
+            }}"""
+
+    @property
+    def companion_lines(self) -> list[str]:
+        lines = ['const val PREFIX_SEARCH = "id:"']
+        if self.concurrent_hosters:
+            lines += [
+                "",
+                f"private const val HOSTER_TIMEOUT = {self.options.hoster_timeout * 1000}L",
+                'private val QUALITY_REGEX = Regex("(\\\\d+)p")',
+            ]
+            if self.options.preferred_quality:
+                lines.append(f"private const val PREFERRED_QUALITY = {string_literal(self.options.preferred_quality)}")
+            if self.options.preferred_hosters:
+                hosters = ", ".join(map(string_literal, self.options.preferred_hosters))
+                lines.append(f"private val PREFERRED_HOSTERS = listOf({hosters})")
+        if self.options.paginated_episodes:
+            lines += ["", f"private const val LIST_PAGE_CONCURRENCY = {self.options.page_concurrency}"]
+        if self.options.details_cache:
+            lines += [
+                "",
+                f"private const val DETAILS_CACHE_SIZE = {self.options.details_cache}",
+                f"private const val DETAILS_CACHE_TTL = {self.options.details_cache_ttl * 1000}L",
+            ]
+        if self.timing_companion_lines:
+            lines += ["", *self.timing_companion_lines]
+        if self.shared_client_lines:
+            lines += ["", *self.shared_client_lines]
+        if self.selectors:
+            lines.append("")
+        for key in filter(self.selectors.__contains__, SELECTORS):
+            name = self._selector_name(key)
+            lines += [
+                f"private const val {name}_SELECTOR = {string_literal(self.selectors[key])}",
+                f"private val {name}_EVALUATOR = QueryParser.parse({name}_SELECTOR)",
+            ]
+        return lines
 
     @property
+    def companion_object(self) -> str:
+        return (
+            "            companion object {\n"
+            + indent_lines(self.companion_lines, " " * 16)
+            + "\n            }"
+        )
+
+    @property
+    def parsed_http_source_imports(self) -> set[str]:
+        return {
+            "eu.kanade.tachiyomi.animesource.model.AnimeFilterList",
+            "eu.kanade.tachiyomi.animesource.model.AnimesPage",
+            "eu.kanade.tachiyomi.animesource.model.SAnime",
+            "eu.kanade.tachiyomi.animesource.model.SEpisode",
+            "eu.kanade.tachiyomi.animesource.model.Video",
+            "eu.kanade.tachiyomi.animesource.online.ParsedAnimeHttpSource",
+            "eu.kanade.tachiyomi.network.GET",
+            "eu.kanade.tachiyomi.network.awaitSuccess",
+            "eu.kanade.tachiyomi.util.asJsoup",
+            "okhttp3.Request",
+            "okhttp3.Response",
+            "org.jsoup.nodes.Document",
+            "org.jsoup.nodes.Element",
+            *self.client_imports,
+            *self.video_list_imports,
+            *self.episode_list_imports,
+            *self.selector_imports,
+        }
+
+    @template
     def parsed_http_source(self) -> str:
         return dedent(
             f"""
         {self.package_line}
 
-        import eu.kanade.tachiyomi.animesource.model.AnimeFilterList
-        import eu.kanade.tachiyomi.animesource.model.AnimesPage
-        import eu.kanade.tachiyomi.animesource.model.SAnime
-        import eu.kanade.tachiyomi.animesource.model.SEpisode
-        import eu.kanade.tachiyomi.animesource.model.Video
-        import eu.kanade.tachiyomi.animesource.online.ParsedAnimeHttpSource
-        import eu.kanade.tachiyomi.network.GET
-        import eu.kanade.tachiyomi.network.awaitSuccess
-        import eu.kanade.tachiyomi.util.asJsoup
-        import okhttp3.Request
-        import okhttp3.Response
-        import org.jsoup.nodes.Document
-        import org.jsoup.nodes.Element
-
-        class {self.className} : ParsedAnimeHttpSource() {{
+{import_block(self.parsed_http_source_imports, " " * 8)}
+
+        {self.class_declaration()} : ParsedAnimeHttpSource(){self.source_interfaces} {{
 
             override val name = "{self.name}"
 
             override val baseUrl = "{self.baseUrl}"
 
-            override val lang = "{self.lang}"
-
-            override val supportsLatest = false
+{self.lang_property}            override val supportsLatest = false
 
-{self.parsed_http_source_screens}
+{self.client_override}{self.parsed_http_source_screens}
 
 {self.parsed_http_source_catalogues}
 
-            companion object {{
-                const val PREFIX_SEARCH = "id:"
-            }}
+{self.settings}{self.companion_object}
         }}
         """[1:]
         )
 
-    @property
+    @template
     def url_handler(self) -> str:
         return dedent(
             f"""
@@ -453,7 +1270,7 @@ class AnimeSourceScaffolder:
         """[1:]
         )
 
-    @property
+    @template
     def url_handler_search(self) -> str:
         return f"""
             override suspend fun getSearchAnime(page: Int, query: String, filters: AnimeFilterList): AnimesPage {{
@@ -473,5 +1290,36 @@ class AnimeSourceScaffolder:
                         setUrlWithoutDomain(response.request.url.toString())
                         initialized = true
                     }}
-                return AnimesPage(listOf(details), false)
-            }}"""[1:]
+{"                cacheDetails(details)" + chr(10) if self.options.details_cache else ""}                return AnimesPage(listOf(details), false)
+            }}{self.details_cache}"""[1:]
+
+    @template
+    def details_cache(self) -> str:
+        if not self.options.details_cache:
+            return ""
+        return f"""
+
+            // Details parsed by the URL intent search, served (once) to the details
+            // request the app sends right after it instead of fetching them again.
+            private val detailsCache = object : LinkedHashMap<String, Pair<Long, SAnime>>(16, 0.75f, true) {{
+                override fun removeEldestEntry(eldest: MutableMap.MutableEntry<String, Pair<Long, SAnime>>) =
+                    size > DETAILS_CACHE_SIZE
+            }}
+
+            private fun cacheDetails(details: SAnime) {{
+                synchronized(detailsCache) {{ detailsCache[details.url] = System.currentTimeMillis() to details }}
+            }}
+
+            private fun cachedDetails(anime: SAnime): SAnime? {{
+                val (time, details) = synchronized(detailsCache) {{ detailsCache.remove(anime.url) }} ?: return null
+                return details.takeIf {{ System.currentTimeMillis() - time < DETAILS_CACHE_TTL }}
+            }}
+
+{self.cached_details_override}"""
+
+    @property
+    def cached_details_override(self) -> str:
+        return """
+            override suspend fun getAnimeDetails(anime: SAnime): SAnime {
+                return cachedDetails(anime) ?: super.getAnimeDetails(anime)
+            }"""[1:]
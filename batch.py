@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterable
+
+from animesource_scaffolder import AnimeSourceScaffolder
+from lockfile import get_lockfile
+from options import ScaffoldOptions
+from profiling import TimingHook, replay
+from scaffolding import SourceSpec
+from theme_index import get_theme_index
+from writer import IncrementalWriter, Writer
+
+
+def load_manifest(path: str) -> list[dict[str, str]]:
+    manifest = Path(path)
+    with manifest.open(encoding="utf-8", newline="") as f:
+        if manifest.suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        elif manifest.suffix == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            raise Exception(f"Unsupported manifest format: {manifest.name} (use .csv or .jsonl)")
+
+    return [
+        {
+            key.strip().lower().replace("-", "_"): str(value).strip()
+            for key, value in row.items()
+            if key is not None and value is not None
+        }
+        for row in rows
+    ]
+
+
+def scaffolder_from_row(
+    row: dict[str, str], options: ScaffoldOptions | None = None, repo_root: str | Path = "."
+) -> AnimeSourceScaffolder:
+    return SourceSpec.from_row(row, options).scaffolder(repo_root)
+
+
+def render_row(row: dict[str, str], options: ScaffoldOptions | None = None, repo_root: str | Path = ".", timed: bool = False):
+    # Runs inside the worker processes, so it must stay a module-level function.
+    # The timing events are returned, the hooks stay in the main process.
+    events = []
+    try:
+        scaffold = SourceSpec.from_row(row, options).scaffolder(repo_root, [events.append] if timed else ())
+        files = scaffold.files
+        scaffold.timing_hooks = ()
+        return scaffold, files, None, events
+    except Exception as e:
+        return None, None, str(e) or e.__class__.__name__, events
+
+
+def run_batch(
+    rows: list[dict[str, str]],
+    jobs: int | None = None,
+    writer: Writer | None = None,
+    force: bool = False,
+    options: ScaffoldOptions | None = None,
+    repo_root: str | Path = ".",
+    timing_hooks: Iterable[TimingHook] = (),
+) -> bool:
+    jobs = jobs or os.cpu_count() or 1
+    timing_hooks = tuple(timing_hooks)
+    # The theme graph is built once here, forked workers inherit it (or read its cache).
+    themes = {row.get("theme") for row in rows if row.get("theme")}
+    if themes:
+        index = get_theme_index(repo_root)
+        for theme in themes & index.themes.keys():
+            index.abstract_members(theme)
+    executor: Executor | None = ProcessPoolExecutor(jobs) if jobs > 1 and len(rows) > 1 else None
+    try:
+        render = partial(render_row, options=options, repo_root=repo_root, timed=bool(timing_hooks))
+        if executor is None:
+            rendered = map(render, rows)
+        else:
+            rendered = executor.map(render, rows, chunksize=max(1, len(rows) // (jobs * 4)))
+
+        writer = writer or IncrementalWriter(root=repo_root)
+        summary = []
+        for index, (row, (scaffold, files, error, events)) in enumerate(zip(rows, rendered), 1):
+            label = row.get("name") or f"row {index}"
+            replay(events, timing_hooks)
+            if scaffold is not None:
+                scaffold.timing_hooks = timing_hooks
+                try:
+                    scaffold.create_dirs(writer, force)
+                    scaffold.create_files(files, writer)
+                    label = scaffold.package_path
+                except Exception as e:
+                    error = str(e) or e.__class__.__name__
+            summary.append((label, error))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        get_lockfile(repo_root).flush()
+
+    failures = [(label, error) for label, error in summary if error is not None]
+    print()
+    for label, error in summary:
+        print(f"FAIL {label}: {error}" if error else f"OK   {label}")
+    print(f"\n{len(summary) - len(failures)} succeeded, {len(failures)} failed.")
+    print(f"Files: {writer.report}")
+    return not failures
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from textwrap import dedent
+
+from animesource_scaffolder import AnimeSourceScaffolder
+from mangasource_scaffolder import MangaSourceScaffolder
+from theme_index import ThemeIndex
+
+THEME_COUNTS = (10, 100, 1000)
+
+
+def theme_file(name: str, members: int = 20) -> str:
+    pkg = name.lower()
+    body = "\n".join(
+        dedent(
+            f"""
+            protected open fun member{index}(page: Int, query: String = "({index})"): String {{
+                val items = listOf(Pair("a", {index}), Pair("b", mapOf(1 to (2 to 3))))
+                return items.joinToString {{ (key, value) -> "$key=$value" }}
+            }}
+            """
+        )
+        for index in range(members)
+    )
+    return dedent(
+        f"""
+        package eu.kanade.tachiyomi.multisrc.{pkg}
+
+        import eu.kanade.tachiyomi.animesource.online.ParsedAnimeHttpSource
+
+        abstract class {name}(
+            override val name: String,
+            override val baseUrl: String,
+            override val lang: String,
+            private val dateFormat: SimpleDateFormat = SimpleDateFormat("MMMM dd, yyyy", Locale.US),
+        ) : ParsedAnimeHttpSource() {{
+            override val supportsLatest = true
+        """
+    ) + body + "\n}\n"
+
+
+def create_themes(root: Path, count: int, members: int = 20) -> list[str]:
+    themes = [f"Theme{index}" for index in range(count)]
+    for theme in themes:
+        theme_dir = root / f"lib-multisrc/{theme.lower()}/src/eu/kanade/tachiyomi/multisrc/{theme.lower()}"
+        theme_dir.mkdir(parents=True)
+        (theme_dir / f"{theme}.kt").write_text(theme_file(theme, members), encoding="utf-8")
+    return themes
+
+
+def measure(function, repeat: int) -> dict[str, float]:
+    # Best-of-N wall time, peak memory from a separate traced run.
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_kib": peak / 1024}
+
+
+def render_benchmarks(root: Path, themes: list[str], renders: int, repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for scaffolder in (AnimeSourceScaffolder, MangaSourceScaffolder):
+        kind = "anime" if scaffolder is AnimeSourceScaffolder else "manga"
+        for variant, is_parsed, theme in (
+            ("http", False, None),
+            ("parsed", True, None),
+            ("theme", False, themes[0]),
+        ):
+            def render():
+                for index in range(renders):
+                    scaffolder(is_parsed, f"Source {index}", "pt-BR", f"https://source{index}.com", theme, repo_root=root).files
+
+            results[f"render/{kind}/{variant}"] = measure(render, repeat)
+    return results
+
+
+def theme_benchmarks(root: Path, themes: list[str], repeat: int, label: str) -> dict[str, dict[str, float]]:
+    sources = {
+        theme: (root / f"lib-multisrc/{theme.lower()}/src/eu/kanade/tachiyomi/multisrc/{theme.lower()}/{theme}.kt").read_text()
+        for theme in themes
+    }
+    scaffolders = [
+        AnimeSourceScaffolder(False, "Source", "en", "https://source.com", theme, repo_root=root) for theme in themes
+    ]
+
+    def get_class_arguments():
+        for scaffold in scaffolders:
+            scaffold._get_class_arguments(sources[scaffold.theme])
+
+    def cold_index():
+        index = ThemeIndex(root)
+        index.cache_path.unlink(missing_ok=True)
+        index.refresh()
+
+    return {
+        f"class_arguments/{label}": measure(get_class_arguments, repeat),
+        f"theme_index/cold/{label}": measure(cold_index, repeat),
+        f"theme_index/warm/{label}": measure(ThemeIndex(root).refresh, repeat),
+    }
+
+
+def run(renders: int, repeat: int, large_members: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for count in THEME_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            themes = create_themes(root, count)
+            if count == THEME_COUNTS[0]:
+                results |= render_benchmarks(root, themes, renders, repeat)
+            results |= theme_benchmarks(root, themes, repeat, f"{count}-themes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        themes = create_themes(root, 1, large_members)
+        results |= theme_benchmarks(root, themes, repeat, "large-file")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"Warning: {name} is not in the baseline, save a new one to compare it", file=sys.stderr)
+            continue
+        for metric in ("seconds", "peak_kib"):
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {previous[metric]:.6g} -> {result[metric]:.6g} "
+                    f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description="Benchmarks template rendering and theme parsing.")
+    args.add_argument("--renders", action="store", type=int, default=200, help="Sources rendered per render benchmark.")
+    args.add_argument("--repeat", action="store", type=int, default=5, help="Runs per benchmark, the fastest one is kept.")
+    args.add_argument(
+        "--large-members",
+        action="store",
+        type=int,
+        default=20000,
+        help="Number of members in the theme used by the large-file benchmark.",
+    )
+    args.add_argument("--baseline", action="store", default="benchmark-baseline.json", help="Stored baseline to compare against.")
+    args.add_argument("--save-baseline", action="store_true", help="Stores the results as the new baseline.")
+    args.add_argument(
+        "--tolerance",
+        action="store",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown/memory growth over the baseline before failing (0.25 = 25%%).",
+    )
+    values = args.parse_args()
+
+    results = run(values.renders, values.repeat, values.large_members)
+    for name, result in results.items():
+        print(f"{name:<32} {result['seconds'] * 1000:>10.3f} ms {result['peak_kib']:>12.1f} KiB")
+
+    baseline_path = Path(values.baseline)
+    if values.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=1) + "\n", encoding="utf-8")
+        print(f"\nBaseline saved to {baseline_path}")
+    elif not baseline_path.exists():
+        # Timings are machine specific, so there is no baseline in the repo: nothing
+        # to compare against must not look like a passing run.
+        print(f"\nNo baseline at {baseline_path}, run with --save-baseline first.", file=sys.stderr)
+        sys.exit(2)
+    else:
+        regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), values.tolerance)
+        if regressions:
+            print("\nRegressions over the baseline:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions over the baseline.")
@@ -1,12 +1,33 @@
 #!/usr/bin/python3
 
 import argparse
+import contextlib
+import json
 import os
+import sys
+from pathlib import Path
 from textwrap import dedent
 from time import sleep
 
 from animesource_scaffolder import AnimeSourceScaffolder
+from batch import load_manifest, run_batch
+from lockfile import get_lockfile
 from mangasource_scaffolder import MangaSourceScaffolder
+from options import (
+    RATE_LIMIT_PROFILES,
+    SAMPLE_ENDPOINT_ALIASES,
+    SAMPLE_ENDPOINTS,
+    SELECTOR_ALIASES,
+    SELECTORS,
+    ScaffoldOptions,
+    read_sample,
+)
+from profiling import JsonLinesHook, TimingHook, profiled
+from reconcile import reconcile
+from selector_analyzer import SelectorAnalyzer, page_of
+from server import ScaffoldServer
+from watcher import watch
+from writer import IncrementalWriter, TarWriter, Writer, ZipWriter
 
 def specific_choice(text: str, valid: list[int] = [1, 2]) -> int:
     while True:
@@ -28,22 +49,147 @@ def specific_choice(text: str, valid: list[int] = [1, 2]) -> int:
         else:
             os.system("clear")
 
-if __name__ == "__main__":
-    args = argparse.ArgumentParser()
-    args.add_argument("-a", "--anime", action="store_true", help="Creates a anime extension. Takes precedence over --manga.")
-    args.add_argument("-m", "--manga", action="store_true", help="Creates a manga extension.")
-    args.add_argument("-t", "--theme", action="store", help="Creates a multisrc extension with the provided theme.")
-    args.add_argument("-n", "--name", action="store", help="Name of the source.")
-    args.add_argument("-l", "--lang", action="store", help="Language of the source.")
-    args.add_argument("-b", "--base-url", action="store", help="Base URL of the source.")
-    args.add_argument("-p",  "--parsed-source", action="store_true", help="Use ParsedHttpSource as base of the main class.")
+def output_writer(values: argparse.Namespace) -> Writer:
+    if values.output_tar is not None:
+        return TarWriter(values.output_tar)
+    elif values.output_zip is not None:
+        return ZipWriter(values.output_zip)
+    return IncrementalWriter(dry_run=values.dry_run, root=values.repo_root)
+
+def sample_files(values: list[str]) -> tuple[tuple[str, str], ...]:
+    files = []
+    for value in values:
+        endpoint, sep, file = value.partition("=")
+        if not sep:
+            raise Exception(f"Invalid --sample-json value: {value!r} (expected endpoint=file.json)")
+        endpoint = endpoint.strip().lower()
+        files.append((SAMPLE_ENDPOINT_ALIASES.get(endpoint, endpoint), str(Path(file).resolve())))
+    return tuple(files)
+
+def selectors(file: str | None, values: list[str]) -> tuple[tuple[str, str], ...]:
+    selectors = {}
+    if file is not None:
+        with open(file, encoding="utf-8") as f:
+            selectors.update(json.load(f))
+    for value in values:
+        key, sep, css = value.partition("=")
+        if not sep:
+            raise Exception(f"Invalid --selector value: {value!r} (expected name=css)")
+        selectors[key] = css
+    return tuple(
+        (SELECTOR_ALIASES.get(key.strip().lower(), key.strip().lower()), css.strip())
+        for key, css in selectors.items()
+    )
+
+def scaffold_options(values: argparse.Namespace) -> ScaffoldOptions:
+    samples = sample_files(values.sample_json)
+    return ScaffoldOptions(
+        disk_cache=values.disk_cache,
+        connection_pool=values.connection_pool,
+        keep_alive=values.keep_alive,
+        rate_limit=values.rate_limit,
+        cdn_hosts=tuple(values.cdn_host),
+        request_timing=values.request_timing,
+        sample_json=tuple((endpoint, read_sample(file)) for endpoint, file in samples),
+        sample_files=samples,
+        concurrent_hosters=values.concurrent_hosters,
+        hoster_timeout=values.hoster_timeout,
+        preferred_quality=values.preferred_quality,
+        preferred_hosters=tuple(values.preferred_hoster),
+        paginated_episodes=values.paginated_episodes,
+        page_concurrency=values.page_concurrency,
+        coroutines=values.coroutines,
+        details_cache=values.details_cache,
+        details_cache_ttl=values.details_cache_ttl,
+        selectors=selectors(values.selectors, values.selector),
+    )
+
+def analyze(argv: list[str]) -> int:
+    args = argparse.ArgumentParser(
+        prog="creator.py analyze",
+        description="Evaluates ParsedHttpSource selectors against saved HTML pages.",
+    )
     args.add_argument(
-        "-j",
-        "--http-source",
+        "--fixture",
+        action="append",
+        default=[],
+        metavar="PAGE=FILE",
+        help="Saved HTML page (popular, latest, search, episodes/chapters, videos). Can be repeated.",
+    )
+    args.add_argument("--selector", action="append", default=[], metavar="NAME=CSS", help="Selector to analyze. Can be repeated.")
+    args.add_argument("--selectors", action="store", metavar="FILE", help="JSON object of NAME: CSS selectors.")
+    args.add_argument("--repeat", action="store", type=int, default=10, help="Runs per selector, the fastest one is kept.")
+    args.add_argument(
+        "--apply-suggestions",
         action="store_true",
-        help="Use HttpSource as base of the main class. Takes precedence over --parsed-source."
+        help="Writes the suggested selectors (identical results on every fixture) instead of the given ones.",
     )
-    values = args.parse_args()
+    args.add_argument("-o", "--output", action="store", metavar="FILE", help="Writes the validated selectors, for --selectors.")
+    values = args.parse_args(argv)
+
+    fixtures = []
+    for value in values.fixture:
+        page, sep, file = value.partition("=")
+        if not sep:
+            raise Exception(f"Invalid --fixture value: {value!r} (expected page=file.html)")
+        page = page.strip().lower()
+        fixtures.append((SELECTOR_ALIASES.get(page, page), file))
+
+    analyzer = SelectorAnalyzer(fixtures, values.repeat)
+    validated, failed = {}, False
+    for report in analyzer.analyze_all(dict(selectors(values.selectors, values.selector))):
+        print(f"{report.key:<13} {report.css}")
+        if report.error is not None:
+            print(f"    not analyzed: {report.error}")
+            validated[report.key] = report.css
+            continue
+        for fixture, matches in report.matches.items():
+            print(f"    {fixture}: {matches} matches")
+        print(f"    cost: {report.checks} checks, {report.seconds * 1000:.3f} ms")
+        for note in report.notes:
+            print(f"    note: {note}")
+        if report.suggestion is not None:
+            print(f"    suggestion: {report.suggestion} ({report.suggestion_checks} checks, same matches)")
+        if report.failed:
+            print(f"    FAIL: matches nothing in the {page_of(report.key)} fixtures")
+            failed = True
+        else:
+            validated[report.key] = report.suggestion if values.apply_suggestions and report.suggestion else report.css
+
+    if values.output is not None:
+        with open(values.output, "w", encoding="utf-8") as f:
+            json.dump(validated, f, indent=1)
+            f.write("\n")
+        print(f"\n{len(validated)} selectors written to {values.output}")
+    return 1 if failed else 0
+
+def create(values: argparse.Namespace, timing_hooks: tuple[TimingHook, ...] = ()) -> int:
+    if values.serve:
+        server = ScaffoldServer(values.jobs, values.repo_root)
+        if values.socket is not None:
+            server.serve_unix(values.socket)
+        else:
+            server.serve_stdio()
+        return 0
+
+    options = scaffold_options(values)
+    writer = output_writer(values)
+    with contextlib.ExitStack() as stack:
+        if values.output_tar == "-":
+            # Keep stdout clean when the archive is streamed through it.
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        return create_sources(values, options, writer, timing_hooks)
+
+def create_sources(
+    values: argparse.Namespace, options: ScaffoldOptions, writer: Writer, timing_hooks: tuple[TimingHook, ...] = ()
+) -> int:
+    if values.batch is not None:
+        with writer:
+            success = run_batch(
+                load_manifest(values.batch), values.jobs, writer, values.force, options, values.repo_root, timing_hooks
+            )
+        return 0 if success else 1
+
     if not (values.anime or values.manga):
         is_manga = specific_choice("""
             Choose the extension type:
@@ -67,9 +213,224 @@ if __name__ == "__main__":
             Enter your choice: """) == 2
     else:
         is_parsed = (not values.http_source) and values.parsed_source
-     
 
-    args = (is_parsed, name, lang, baseUrl, values.theme)
+
+    args = (is_parsed, name, lang, baseUrl, values.theme, options, values.repo_root, timing_hooks)
     scaffold = MangaSourceScaffolder(*args) if is_manga else AnimeSourceScaffolder(*args)
-    scaffold.create_dirs()
-    scaffold.create_files()
+    with writer:
+        scaffold.create_dirs(writer, values.force)
+        scaffold.create_files(writer=writer)
+    get_lockfile(values.repo_root).flush()
+    print(f"\n{writer.report}")
+    return 0
+
+def watch_themes(argv: list[str]) -> int:
+    args = argparse.ArgumentParser(
+        prog="creator.py watch",
+        description="Updates the themed extensions whose theme constructor changed in lib-multisrc.",
+    )
+    args.add_argument("-C", "--repo-root", action="store", default=".", metavar="DIR", help="Root of the extensions repository.")
+    args.add_argument(
+        "--poll",
+        action="store",
+        type=float,
+        metavar="SECONDS",
+        help="Polls the theme files at this interval instead of using inotify.",
+    )
+    args.add_argument("--once", action="store_true", help="Only applies the changes made since the last run, then exits.")
+    values = args.parse_args(argv)
+    return watch(values.repo_root, values.poll, values.once)
+
+def reconcile_sources(argv: list[str]) -> int:
+    args = argparse.ArgumentParser(
+        prog="creator.py reconcile",
+        description="Re-renders the extensions recorded in scaffolder.lock with the current templates.",
+    )
+    args.add_argument("modules", nargs="*", metavar="MODULE", help="Only these modules (e.g. src/pt/animefire). Default: all.")
+    args.add_argument("-C", "--repo-root", action="store", default=".", metavar="DIR", help="Root of the extensions repository.")
+    args.add_argument("--jobs", action="store", type=int, help="Worker processes. Defaults to the CPU count.")
+    args.add_argument("--dry-run", action="store_true", help="Only reports what would change.")
+    values = args.parse_args(argv)
+    return 0 if reconcile(values.repo_root, values.jobs, values.dry_run, values.modules) else 1
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["analyze"]:
+        sys.exit(analyze(sys.argv[2:]))
+    if sys.argv[1:2] == ["watch"]:
+        sys.exit(watch_themes(sys.argv[2:]))
+    if sys.argv[1:2] == ["reconcile"]:
+        sys.exit(reconcile_sources(sys.argv[2:]))
+
+    args = argparse.ArgumentParser()
+    args.add_argument("-a", "--anime", action="store_true", help="Creates a anime extension. Takes precedence over --manga.")
+    args.add_argument("-m", "--manga", action="store_true", help="Creates a manga extension.")
+    args.add_argument("-t", "--theme", action="store", help="Creates a multisrc extension with the provided theme.")
+    args.add_argument("-n", "--name", action="store", help="Name of the source.")
+    args.add_argument("-l", "--lang", action="store", help="Language of the source, or a comma-separated list for a multi-language module.")
+    args.add_argument("-b", "--base-url", action="store", help="Base URL of the source.")
+    args.add_argument("-p",  "--parsed-source", action="store_true", help="Use ParsedHttpSource as base of the main class.")
+    args.add_argument(
+        "-j",
+        "--http-source",
+        action="store_true",
+        help="Use HttpSource as base of the main class. Takes precedence over --parsed-source."
+    )
+    args.add_argument(
+        "--batch",
+        action="store",
+        metavar="MANIFEST",
+        help="Creates every source listed in a .csv or .jsonl manifest (columns: type, name, lang, base_url, base_class, theme).",
+    )
+    args.add_argument("--jobs", action="store", type=int, help="Number of workers used by --batch and --serve.")
+    args.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keeps running and answers JSON-RPC scaffold requests (one per line) from stdin, or from --socket.",
+    )
+    args.add_argument("--socket", action="store", metavar="PATH", help="Unix socket used by --serve instead of stdin/stdout.")
+    args.add_argument(
+        "-C",
+        "--repo-root",
+        action="store",
+        default=".",
+        metavar="DIR",
+        help="Root of the extensions repository (lib-multisrc, src), the current directory by default.",
+    )
+    args.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Overwrites existing extensions instead of failing when the package, class or host is already taken.",
+    )
+    client = args.add_argument_group("generated client")
+    client.add_argument("--disk-cache", action="store", type=int, metavar="MB", help="Adds an OkHttp disk cache of the given size.")
+    client.add_argument("--connection-pool", action="store", type=int, metavar="N", help="Max idle connections kept alive in the pool.")
+    client.add_argument("--keep-alive", action="store", type=int, metavar="SECONDS", help="Keep-alive duration of pooled connections.")
+    client.add_argument(
+        "--rate-limit",
+        action="store",
+        choices=RATE_LIMIT_PROFILES,
+        help="Rate limit profile (requests/s to the site, to each CDN host): "
+        + ", ".join(f"{name} ({site}, {cdn})" for name, (site, cdn) in RATE_LIMIT_PROFILES.items())
+        + ". Manga sources use 'default' unless another one is given.",
+    )
+    client.add_argument(
+        "--cdn-host",
+        action="append",
+        default=[],
+        metavar="HOST",
+        help="Image/video CDN host, rate limited separately with the higher limit of the profile. Can be repeated.",
+    )
+    client.add_argument(
+        "--request-timing",
+        action="store_true",
+        help="Adds an EventListener that logs the DNS/connect/TTFB/body timings of every request, enabled by a debug preference.",
+    )
+    args.add_argument(
+        "--sample-json",
+        action="append",
+        default=[],
+        metavar="ENDPOINT=FILE",
+        help="Saved JSON response of an endpoint ("
+        + ", ".join([*SAMPLE_ENDPOINTS, *SAMPLE_ENDPOINT_ALIASES])
+        + "), used to generate @Serializable DTOs and wire the matching *Parse stubs to them. HttpSource only.",
+    )
+    videos = args.add_argument_group("video list (anime only)")
+    videos.add_argument(
+        "--concurrent-hosters",
+        action="store_true",
+        help="Generates a getVideoList that resolves every hoster in parallel, with per-hoster timeouts and failure isolation.",
+    )
+    videos.add_argument("--hoster-timeout", action="store", type=int, default=20, metavar="SECONDS", help="Timeout of each hoster.")
+    videos.add_argument("--preferred-quality", action="store", metavar="QUALITY", help="Quality sorted first, e.g. 1080p.")
+    videos.add_argument(
+        "--preferred-hoster",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Hoster sorted first, in the given order. Can be repeated.",
+    )
+    episodes = args.add_argument_group("episode/chapter list")
+    episodes.add_argument(
+        "--paginated-episodes",
+        "--paginated-chapters",
+        action="store_true",
+        help="Generates a getEpisodeList/getChapterList that reads the page count from the first page and fetches the other ones concurrently.",
+    )
+    episodes.add_argument(
+        "--page-concurrency",
+        action="store",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Max pages of the list fetched at the same time.",
+    )
+    search = args.add_argument_group("search by id")
+    search.add_argument(
+        "--details-cache",
+        action="store",
+        type=int,
+        metavar="N",
+        help="Keeps the last N details parsed by the URL intent search in memory, for the details request that follows.",
+    )
+    search.add_argument(
+        "--details-cache-ttl",
+        action="store",
+        type=int,
+        default=300,
+        metavar="SECONDS",
+        help="How long a cached entry can be served.",
+    )
+    manga = args.add_argument_group("manga only")
+    manga.add_argument(
+        "--coroutines",
+        action="store_true",
+        help="Generates suspend getSearchManga/getChapterList/getPageList overrides using awaitSuccess instead of Rx Observables.",
+    )
+    parsing = args.add_argument_group("selectors (ParsedHttpSource only)")
+    parsing.add_argument(
+        "--selector",
+        action="append",
+        default=[],
+        metavar="NAME=CSS",
+        help=f"Selector precompiled into the generated class ({', '.join(SELECTORS)}). Can be repeated.",
+    )
+    parsing.add_argument(
+        "--selectors",
+        action="store",
+        metavar="FILE",
+        help="JSON object of NAME: CSS selectors, overridden by --selector.",
+    )
+    profiling = args.add_argument_group("profiling")
+    profiling.add_argument(
+        "--profile",
+        action="store",
+        metavar="FILE",
+        help="Writes a JSON-lines timing event for every scaffolding phase (theme parsing, templates, writes) to FILE ('-' for stderr).",
+    )
+    profiling.add_argument("--cprofile", action="store", metavar="FILE", help="Dumps cProfile stats of the main process to FILE.")
+    profiling.add_argument(
+        "--tracemalloc",
+        action="store",
+        type=int,
+        metavar="N",
+        help="Prints the peak memory and the N largest allocation sites to stderr.",
+    )
+    output = args.add_mutually_exclusive_group()
+    output.add_argument("--dry-run", action="store_true", help="Only show which files would be created or updated.")
+    output.add_argument(
+        "--output-tar",
+        action="store",
+        metavar="FILE",
+        help="Writes the generated files into a tar archive instead ('-' streams it to stdout).",
+    )
+    output.add_argument("--output-zip", action="store", metavar="FILE", help="Writes the generated files into a zip archive instead.")
+    values = args.parse_args()
+    with contextlib.ExitStack() as stack:
+        timing_hooks = ()
+        if values.profile is not None:
+            events = sys.stderr if values.profile == "-" else stack.enter_context(open(values.profile, "w", encoding="utf-8"))
+            timing_hooks = (JsonLinesHook(events),)
+        with profiled(values.cprofile, values.tracemalloc):
+            status = create(values, timing_hooks)
+    sys.exit(status)
@@ -0,0 +1,315 @@
+import re
+
+from kotlin_syntax import string_literal
+
+_KEYWORDS = {
+    "as", "break", "class", "continue", "do", "else", "false", "for", "fun", "if",
+    "in", "interface", "is", "null", "object", "package", "return", "super", "this",
+    "throw", "true", "try", "typealias", "typeof", "val", "var", "when", "while",
+}
+_INT_MAX = 2**31 - 1
+
+
+class Shape:
+    # Everything seen at one position of the samples (merged across array items).
+    def __init__(self):
+        self.types: set[str] = set()
+        self.is_long = False
+        self.fields: dict[str, Shape] = {}
+        self.field_counts: dict[str, int] = {}
+        self.objects = 0
+        self.items: Shape | None = None
+
+    def merge(self, value) -> "Shape":
+        if value is None:
+            self.types.add("null")
+        elif isinstance(value, bool):
+            self.types.add("bool")
+        elif isinstance(value, int):
+            self.types.add("int")
+            self.is_long = self.is_long or abs(value) > _INT_MAX
+        elif isinstance(value, float):
+            self.types.add("float")
+        elif isinstance(value, str):
+            self.types.add("string")
+        elif isinstance(value, list):
+            self.types.add("array")
+            self.items = self.items or Shape()
+            for item in value:
+                self.items.merge(item)
+        elif isinstance(value, dict):
+            self.types.add("object")
+            self.objects += 1
+            for key, item in value.items():
+                self.fields.setdefault(key, Shape()).merge(item)
+                self.field_counts[key] = self.field_counts.get(key, 0) + 1
+        return self
+
+
+def to_pascal_case(value: str) -> str:
+    words = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+", value)
+    name = "".join(word[:1].upper() + word[1:] for word in words)
+    if not name or name[0].isdigit():
+        name = "Field" + name
+    return name
+
+
+def to_property_name(key: str) -> str:
+    name = to_pascal_case(key)
+    name = name[:1].lower() + name[1:]
+    return f"`{name}`" if name in _KEYWORDS else name
+
+
+class DtoInferrer:
+    def __init__(self):
+        # name -> rendered fields
+        self.classes: dict[str, tuple[str, ...]] = {}
+        # name -> (property, Kotlin type) of its fields
+        self.properties: dict[str, tuple[tuple[str, str], ...]] = {}
+        # name -> position of the class in the file, parents before their fields.
+        self.order: dict[str, int] = {}
+        self.visits = 0
+        self.uses_json_element = False
+
+    def add(self, root_name: str, sample) -> str:
+        return self.kotlin_type(Shape().merge(sample), root_name, root_name)
+
+    def kotlin_type(self, shape: Shape, name: str, parent: str) -> str:
+        types = shape.types - {"null"}
+        nullable = "?" if "null" in shape.types else ""
+        match sorted(types):
+            case ["bool"]:
+                return "Boolean" + nullable
+            case ["int"]:
+                return ("Long" if shape.is_long else "Int") + nullable
+            case ["float"] | ["float", "int"]:
+                return "Double" + nullable
+            case ["string"]:
+                return "String" + nullable
+            case ["array"]:
+                items = shape.items
+                if items is None or not items.types:
+                    self.uses_json_element = True
+                    return "List<JsonElement>" + nullable
+                return f"List<{self.kotlin_type(items, name, parent)}>" + nullable
+            case ["object"]:
+                return self.declare(shape, name, parent) + nullable
+            case _:
+                self.uses_json_element = True
+                return "JsonElement" + ("?" if "null" in shape.types or not types else "")
+
+    def declare(self, shape: Shape, name: str, parent: str) -> str:
+        visit = self.visits
+        self.visits += 1
+        fields, properties = [], []
+        for key, field in shape.fields.items():
+            prefix = to_pascal_case(key)
+            field_type = self.kotlin_type(field, prefix, parent + prefix)
+            optional = shape.field_counts[key] < shape.objects
+            if optional and not field_type.endswith("?"):
+                field_type += "?"
+            prop = to_property_name(key)
+            if any(prop == other for other, _ in properties):
+                # Keys that only differ in case or separators (fooBar, foo_bar).
+                index = 2
+                while any(f"{prop.strip('`')}{index}" == other for other, _ in properties):
+                    index += 1
+                prop = f"{prop.strip('`')}{index}"
+            properties.append((prop, field_type))
+            serial_name = f"@SerialName({string_literal(key)}) " if prop.strip("`") != key else ""
+            default = " = null" if field_type.endswith("?") else ""
+            fields.append(f"{serial_name}val {prop}: {field_type}{default},")
+        fields = tuple(fields)
+
+        # Reuse identical classes, otherwise qualify the name with its parent.
+        candidates = [name + "Dto", parent + "Dto"]
+        index = 2
+        while all(self.classes.get(candidate, fields) != fields for candidate in candidates):
+            candidates.append(f"{parent}{index}Dto")
+            index += 1
+        candidate = next(c for c in candidates if self.classes.get(c, fields) == fields)
+        self.classes[candidate] = fields
+        self.properties[candidate] = tuple(properties)
+        self.order.setdefault(candidate, visit)
+        return candidate
+
+    def render(self) -> str:
+        declarations = []
+        for name in sorted(self.classes, key=self.order.__getitem__):
+            fields = self.classes[name]
+            if not fields:
+                declarations.append(f"@Serializable\nclass {name}")
+                continue
+            body = "\n".join(f"    {field}" for field in fields)
+            declarations.append(f"@Serializable\ndata class {name}(\n{body}\n)")
+        return "\n\n".join(declarations)
+
+    @property
+    def imports(self) -> set[str]:
+        imports = {"kotlinx.serialization.Serializable"}
+        if any("@SerialName" in field for fields in self.classes.values() for field in fields):
+            imports.add("kotlinx.serialization.SerialName")
+        if self.uses_json_element:
+            imports.add("kotlinx.serialization.json.JsonElement")
+        return imports
+
+
+# Model property -> (conversion, DTO property names, fragments of DTO property
+# names) it is filled from, the exact names first. Compared in lowercase.
+ENTRY_PROPERTIES = (
+    ("url", "String", ("url", "slug", "link", "href", "path", "id"), ("slug",)),
+    ("title", "String", ("title", "name"), ("title", "name")),
+    ("thumbnail_url", "String?", ("thumbnail", "thumb", "poster", "cover", "image", "img"), ("thumb", "poster", "cover", "image")),
+    ("description", "String?", ("description", "synopsis", "overview", "summary", "plot"), ("description", "synopsis")),
+    ("genre", "String?", ("genres", "genre", "tags", "categories"), ("genre",)),
+)
+EPISODE_PROPERTIES = (
+    ("url", "String", ("url", "slug", "link", "href", "path", "id"), ("slug",)),
+    ("name", "String", ("title", "name"), ("title", "name")),
+    ("episode_number", "Float", ("number", "episode", "num", "ep"), ("number",)),
+)
+HAS_NEXT_PAGE = ("Boolean", ("hasnextpage", "hasnext", "hasmore", "next"), ("hasnext", "hasmore"))
+
+_LIST = re.compile(r"List<(\w+)(\??)>(\??)")
+
+
+def convert(prop: str, kotlin_type: str, target: str) -> str | None:
+    # Kotlin expression converting the property to the target type, None if it can't.
+    nullable = kotlin_type.endswith("?")
+    base = kotlin_type.removesuffix("?")
+    dot = "?." if nullable else "."
+    match target, base:
+        case "String" | "String?", "String":
+            return f"{prop}.orEmpty()" if nullable and target == "String" else prop
+        case "String" | "String?", "Int" | "Long" | "Double":
+            text = f"{prop}{dot}toString()"
+            return f"{text}.orEmpty()" if nullable and target == "String" else text
+        case "String" | "String?", "List<String>" | "List<String?>":
+            text = f"{prop}{dot}joinToString()"
+            return f"{text}.orEmpty()" if nullable and target == "String" else text
+        case "Float", "Int" | "Long" | "Double":
+            return f"{prop}?.toFloat() ?: -1F" if nullable else f"{prop}.toFloat()"
+        case "Boolean", "Boolean":
+            return f"{prop} == true" if nullable else prop
+    return None
+
+
+def find_property(
+    properties: tuple[tuple[str, str], ...], target: str, names: tuple[str, ...], fragments: tuple[str, ...], used: set[str]
+) -> str | None:
+    # Conversion of the best matching property, None if there is none.
+    candidates = [
+        (prop, kotlin_type) for prop, kotlin_type in properties if prop not in used and convert(prop, kotlin_type, target)
+    ]
+    lower = [(prop.strip("`").lower(), prop, kotlin_type) for prop, kotlin_type in candidates]
+    for name in names:
+        for normalized, prop, kotlin_type in lower:
+            if normalized == name:
+                used.add(prop)
+                return convert(prop, kotlin_type, target)
+    for fragment in fragments:
+        for normalized, prop, kotlin_type in lower:
+            if fragment in normalized:
+                used.add(prop)
+                return convert(prop, kotlin_type, target)
+    return None
+
+
+class DtoMapper:
+    # Extension functions converting the inferred DTOs into the source models,
+    # so the generated parse methods start from a working (if naive) mapping.
+    # The parse expressions are in the anime vocabulary (the source template is
+    # translated as a whole), the functions are translated with `translate`.
+    def __init__(self, inferrer: DtoInferrer, translate):
+        self.inferrer = inferrer
+        self.translate = translate
+        # (receiver, name) -> declaration
+        self.functions: dict[tuple[str, str], str] = {}
+        # Models used by the functions, in the anime vocabulary.
+        self.models: set[str] = set()
+
+    def items(self, kotlin_type: str) -> tuple[str, str] | None:
+        # (item class, suffix making it a List<item class>) of a list of DTOs.
+        match = _LIST.fullmatch(kotlin_type)
+        if match is None or match[1] not in self.inferrer.properties:
+            return None
+        return match[1], (".orEmpty()" if match[3] else "") + (".filterNotNull()" if match[2] else "")
+
+    def list_property(self, dto: str) -> tuple[str, str] | None:
+        # (item class, expression) of the first list of DTOs of the class.
+        for prop, kotlin_type in self.inferrer.properties.get(dto, ()):
+            if items := self.items(kotlin_type):
+                return items[0], prop + items[1]
+        return None
+
+    def declare(self, receiver: str, name: str, model: str, result: str, body: list[str]):
+        if (receiver, name) not in self.functions:
+            self.models.add(model)
+            self.functions[receiver, name] = "\n".join(
+                [f"fun {receiver}.{self.translate(name)}(): {self.translate(result)} = {body[0]}", *body[1:]]
+            )
+
+    def model(self, dto: str, name: str, model: str, properties: tuple) -> str:
+        lines = [f"{self.translate(model)}.create().also {{"]
+        used = set()
+        for target, conversion, names, fragments in properties:
+            value = find_property(self.inferrer.properties[dto], conversion, names, fragments, used)
+            if value is not None:
+                lines.append(f"    it.{self.translate(target)} = {value}")
+            elif conversion != "String?":
+                lines.append(f"    // TODO: it.{self.translate(target)}")
+        lines.append("}")
+        self.declare(dto, name, model, model, lines)
+        return name
+
+    def entry(self, dto: str) -> str:
+        return self.model(dto, "toSAnime", "SAnime", ENTRY_PROPERTIES)
+
+    def episode(self, dto: str) -> str:
+        return self.model(dto, "toSEpisode", "SEpisode", EPISODE_PROPERTIES)
+
+    def page(self, dto: str) -> str | None:
+        if items := self.items(dto):
+            # List roots are mapped in place: List<A> and List<B> receivers would clash on the JVM.
+            return f"AnimesPage(response.parseAs<{dto}>(){items[1]}.map {{ it.{self.entry(items[0])}() }}, false)"
+        if dto not in self.inferrer.properties:
+            return None
+        has_next = find_property(self.inferrer.properties[dto], *HAS_NEXT_PAGE, set()) or "false"
+        page = self.translate("AnimesPage")
+        if entries := self.list_property(dto):
+            entry = self.translate(self.entry(entries[0]))
+            body = [f"{page}({entries[1]}.map {{ it.{entry}() }}, {has_next})"]
+        else:
+            body = [f"{page}(emptyList(), {has_next}) // TODO: entries"]
+        self.declare(dto, "toAnimesPage", "AnimesPage", "AnimesPage", body)
+        return f"response.parseAs<{dto}>().toAnimesPage()"
+
+    def details(self, dto: str) -> str | None:
+        if dto not in self.inferrer.properties:
+            return None
+        return f"response.parseAs<{dto}>().{self.entry(dto)}()"
+
+    def episodes(self, dto: str) -> str | None:
+        if items := self.items(dto):
+            return f"response.parseAs<{dto}>(){items[1]}.map {{ it.{self.episode(items[0])}() }}"
+        if (episodes := self.list_property(dto)) is None:
+            return None
+        episode = self.translate(self.episode(episodes[0]))
+        body = [f"{episodes[1]}.map {{ it.{episode}() }}"]
+        self.declare(dto, "toEpisodeList", "SEpisode", "List<SEpisode>", body)
+        return f"response.parseAs<{dto}>().toEpisodeList()"
+
+    def parse(self, endpoint: str, dto: str) -> str | None:
+        # Expression of `response` returning the model of the endpoint, None if
+        # the sample has no usable structure.
+        match endpoint:
+            case "popular" | "latest" | "search":
+                return self.page(dto)
+            case "details":
+                return self.details(dto)
+            case "episodes":
+                return self.episodes(dto)
+        return None
+
+    def render(self) -> str:
+        return "\n\n".join(self.functions.values())
@@ -0,0 +1,487 @@
+import re
+from dataclasses import dataclass
+from typing import Iterator, NamedTuple
+
+VISIBILITY_MODIFIERS = {"private", "protected", "internal", "public"}
+PARAMETER_MODIFIERS = VISIBILITY_MODIFIERS | {
+    "override", "open", "final", "abstract", "lateinit", "vararg", "noinline", "crossinline",
+}
+MEMBER_MODIFIERS = PARAMETER_MODIFIERS | {
+    "suspend", "inline", "operator", "infix", "tailrec", "external", "const",
+}
+_OPENING = {"(": ")", "[": "]", "{": "}"}
+
+
+@dataclass(frozen=True)
+class Parameter:
+    name: str
+    type: str
+    default: str | None = None
+    visibility: str | None = None
+    # "val", "var" or None for plain constructor parameters.
+    binding: str | None = None
+    modifiers: tuple[str, ...] = ()
+
+    @property
+    def is_optional(self) -> bool:
+        return self.default is not None
+
+    def declaration(self) -> str:
+        head = " ".join((*self.modifiers, *filter(None, (self.binding,))))
+        text = f"{head + ' ' if head else ''}{self.name}: {self.type}"
+        if self.default is not None:
+            text += f" = {' '.join(line.strip() for line in self.default.splitlines())}"
+        return text
+
+
+@dataclass(frozen=True)
+class Member:
+    name: str
+    kind: str  # fun, val or var
+    modifiers: tuple[str, ...]
+    # Declaration without modifiers nor default values, ready for an override.
+    declaration: str
+    # Imports of the declaring file used by the declaration.
+    imports: tuple[str, ...] = ()
+
+    @property
+    def key(self) -> tuple[bool, str]:
+        return self.kind == "fun", self.name
+
+    @property
+    def is_abstract(self) -> bool:
+        return "abstract" in self.modifiers
+
+
+@dataclass(frozen=True)
+class ClassInfo:
+    name: str
+    parameters: list[Parameter]
+    # Called supertype (the superclass) without its arguments, if any.
+    superclass: str | None
+    members: list[Member]
+
+
+class Token(NamedTuple):
+    kind: str  # ident, string, number or punct
+    text: str
+    start: int
+    end: int
+
+
+def _string_end(text: str, start: int) -> int:
+    # Index right after the string literal starting at `start`, templates included.
+    raw = text.startswith('"""', start)
+    position = start + (3 if raw else 1)
+    while position < len(text):
+        char = text[position]
+        if raw and text.startswith('"""', position):
+            # A raw string may end with more quotes than the delimiter.
+            while text.startswith('"', position + 3):
+                position += 1
+            return position + 3
+        if not raw and char == '"':
+            return position + 1
+        if not raw and char == "\\":
+            position += 2
+            continue
+        if char == "$" and text.startswith("{", position + 1):
+            position = _block_end(text, position + 1)
+            continue
+        position += 1
+    raise Exception(f"Unterminated string literal at offset {start}")
+
+
+def _block_end(text: str, start: int) -> int:
+    # Index right after the `{...}` string template starting at `start`.
+    depth = 0
+    for token in tokenize(text, start):
+        if token.text == "{":
+            depth += 1
+        elif token.text == "}":
+            depth -= 1
+            if depth == 0:
+                return token.end
+    raise Exception(f"Unterminated string template at offset {start}")
+
+
+def _comment_end(text: str, start: int) -> int:
+    if text.startswith("//", start):
+        end = text.find("\n", start)
+        return len(text) if end < 0 else end
+    # Block comments nest in Kotlin.
+    depth, position = 0, start
+    while position < len(text):
+        if text.startswith("/*", position):
+            depth += 1
+            position += 2
+        elif text.startswith("*/", position):
+            depth -= 1
+            position += 2
+            if depth == 0:
+                return position
+        else:
+            position += 1
+    raise Exception(f"Unterminated comment at offset {start}")
+
+
+_SCAN = re.compile(
+    r"(?P<space>\s+)|(?P<ident>[^\W\d]\w*)|(?P<number>\d[\w.]*)|(?P<comment>//|/\*)|(?P<quote>[\"'`])|(?P<punct>.)",
+    re.DOTALL,
+)
+
+
+def tokenize(text: str, start: int = 0) -> Iterator[Token]:
+    # Lazy, so the callers only pay for the part of the file they read.
+    position = start
+    length = len(text)
+    scan = _SCAN.match
+    while position < length:
+        match = scan(text, position)
+        kind = match.lastgroup
+        if kind == "space":
+            position = match.end()
+        elif kind == "comment":
+            position = _comment_end(text, position)
+        elif kind == "quote":
+            quote = match.group()
+            if quote == '"':
+                end = _string_end(text, position)
+                yield Token("string", text[position:end], position, end)
+            elif quote == "'":
+                end = position + 1
+                while end < length and text[end] != "'":
+                    end += 2 if text[end] == "\\" else 1
+                end += 1
+                yield Token("string", text[position:end], position, end)
+            else:
+                end = text.index("`", position + 1) + 1
+                yield Token("ident", text[position + 1 : end - 1], position, end)
+            position = end
+        else:
+            end = match.end()
+            yield Token(kind, match.group(), position, end)
+            position = end
+
+
+_GROUP_CHARS = re.compile(r"""[(){}\[\]"'`]|//|/\*""")
+
+
+def group_end(text: str, start: int) -> int:
+    # Index right after the (...), [...] or {...} group starting at `start`,
+    # only looking at brackets, strings and comments.
+    closing = []
+    position = start
+    while True:
+        match = _GROUP_CHARS.search(text, position)
+        if match is None:
+            raise Exception(f"Unbalanced brackets at offset {start}")
+        char, position = match.group(), match.start()
+        if char in _OPENING:
+            closing.append(_OPENING[char])
+            position += 1
+        elif char in ")]}":
+            position += 1
+            if closing and char == closing[-1]:
+                closing.pop()
+                if not closing:
+                    return position
+        elif char == '"':
+            position = _string_end(text, position)
+        elif char == "'":
+            position += 1
+            while position < len(text) and text[position] != "'":
+                position += 2 if text[position] == "\\" else 1
+            position += 1
+        elif char == "`":
+            position = text.index("`", position + 1) + 1
+        else:
+            position = _comment_end(text, position)
+
+
+_NAMED_ARGUMENT = re.compile(r"(\w+)\s*=(?!=)\s*(.*)", re.DOTALL)
+
+
+def parse_arguments(text: str) -> list[tuple[str | None, str]]:
+    # The arguments of a call, `text` being what is between its parentheses:
+    # (name, value) for the named ones, (None, value) for the positional ones.
+    text += ")"
+    tokens = _Tokens(text)
+    arguments = []
+    while tokens.peek().text != ")":
+        value = _read_until(tokens, text, (",", ")"), angles=False)
+        named = _NAMED_ARGUMENT.fullmatch(value)
+        arguments.append((named[1], named[2]) if named else (None, value))
+        if tokens.peek().text == ",":
+            tokens.next()
+    return arguments
+
+
+class _Tokens:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.peeked: Token | None = None
+
+    def peek(self) -> Token | None:
+        if self.peeked is None:
+            self.peeked = next(self.tokens, None)
+        return self.peeked
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise Exception("Unexpected end of file")
+        self.peeked = None
+        return token
+
+    def skip_balanced(self) -> Token:
+        # Skips a (...), [...] or {...} group, returns its closing token.
+        opening = self.next()
+        end = group_end(self.text, opening.start)
+        self.tokens = tokenize(self.text, end)
+        return Token("punct", _OPENING[opening.text], end - 1, end)
+
+    def skip_annotation(self):
+        # @Name, @field:Name, @a.b.Name(args)
+        self.next()
+        self.next()
+        while self.peek() is not None and self.peek().text in (".", ":"):
+            self.next()
+            self.next()
+        if self.peek() is not None and self.peek().text == "(":
+            self.skip_balanced()
+
+
+def _find_class(tokens: _Tokens, class_name: str) -> bool:
+    previous = None
+    while (token := tokens.peek()) is not None:
+        tokens.next()
+        if previous is not None and previous.text == "class" and token.text == class_name and token.kind == "ident":
+            return True
+        previous = token
+    return False
+
+
+def parse_constructor(class_name: str, text: str) -> list[Parameter] | None:
+    # Parameters of the primary constructor of `class_name`, None if the class
+    # isn't declared in `text`. Stops reading right after the constructor.
+    tokens = _Tokens(text)
+    if not _find_class(tokens, class_name):
+        return None
+    return _parse_header(tokens, text)
+
+
+def parse_class(class_name: str, text: str, members: bool = True) -> ClassInfo | None:
+    # Constructor, superclass and members (not their bodies) of `class_name`.
+    # Without members, stops reading right after the superclass.
+    tokens = _Tokens(text)
+    if not _find_class(tokens, class_name):
+        return None
+    parameters = _parse_header(tokens, text)
+
+    superclass = None
+    if tokens.peek() is not None and tokens.peek().text == ":":
+        tokens.next()
+        while (token := tokens.peek()) is not None and token.text not in ("{", "}"):
+            supertype = _read_until(tokens, text, (",", "{", "}"), angles=True, statement=True)
+            if superclass is None and supertype.endswith(")"):
+                superclass = supertype[: supertype.index("(")].split("<")[0].strip()
+            if tokens.peek() is None or tokens.peek().text != ",":
+                break
+            tokens.next()
+
+    if not members:
+        return ClassInfo(class_name, parameters, superclass, [])
+    body = []
+    if tokens.peek() is not None and tokens.peek().text == "{":
+        imports = _file_imports(text)
+        tokens.next()
+        body = _parse_body(tokens, text, imports)
+    return ClassInfo(class_name, parameters, superclass, body)
+
+
+def _file_imports(text: str) -> dict[str, str]:
+    # Simple name -> import, imports are line-based.
+    imports = {}
+    for line in text.splitlines():
+        words = line.split()
+        if words[:1] == ["import"] and len(words) >= 2:
+            if len(words) >= 4 and words[2] == "as":
+                imports[words[3]] = f"{words[1]} as {words[3]}"
+            else:
+                imports[words[1].rsplit(".", 1)[-1]] = words[1]
+        elif words[:1] and words[0] not in ("package", "import") and not words[0].startswith(("//", "/*", "*", "@file")):
+            break
+    return imports
+
+
+def _parse_body(tokens: _Tokens, text: str, imports: dict[str, str]) -> list[Member]:
+    members, modifiers = [], []
+    while (token := tokens.peek()) is not None:
+        if token.text == "}":
+            tokens.next()
+            break
+        if token.text == "@":
+            tokens.skip_annotation()
+        elif token.text in _OPENING:
+            # Function bodies, init blocks, nested classes...
+            tokens.skip_balanced()
+            modifiers = []
+        elif token.kind == "ident" and token.text in MEMBER_MODIFIERS:
+            modifiers.append(tokens.next().text)
+        elif token.kind == "ident" and token.text in ("fun", "val", "var"):
+            members.append(_parse_member(tokens, text, tuple(modifiers), imports))
+            modifiers = []
+        else:
+            tokens.next()
+            modifiers = []
+    return members
+
+
+def _parse_member(tokens: _Tokens, text: str, modifiers: tuple[str, ...], imports: dict[str, str]) -> Member:
+    kind = tokens.next().text
+    parts = [kind]
+    if tokens.peek().text == "<":
+        parts.append(_read_type_parameters(tokens, text))
+    # The name is the last identifier before the parameters (or the type),
+    # after a possible receiver like `List<Video>.`.
+    head = _read_until(tokens, text, ("(", ":", "=", "{", "}"), angles=True, statement=True)
+    name = head.rsplit(".", 1)[-1].strip()
+    parts.append(head)
+
+    if kind == "fun" and tokens.peek() is not None and tokens.peek().text == "(":
+        tokens.next()
+        parameters = []
+        while tokens.peek().text != ")":
+            parameters.append(_parse_parameter(tokens, text))
+            if tokens.peek().text == ",":
+                tokens.next()
+        tokens.next()
+        parts[-1] += "(" + ", ".join(
+            f"{'vararg ' if 'vararg' in parameter.modifiers else ''}{parameter.name}: {parameter.type}"
+            for parameter in parameters
+        ) + ")"
+
+    if tokens.peek() is not None and tokens.peek().text == ":":
+        tokens.next()
+        parts[-1] += ": " + _read_until(tokens, text, ("=", "{", "}"), angles=True, statement=True)
+
+    declaration = " ".join(" ".join(parts).split())
+    names = set(re.findall(r"\b[A-Za-z_]\w*\b", declaration))
+    used_imports = tuple(sorted(imports[name] for name in names if name in imports))
+    modifiers = tuple(modifier for modifier in modifiers if modifier in MEMBER_MODIFIERS)
+    return Member(name, kind, modifiers, declaration, used_imports)
+
+
+def _read_type_parameters(tokens: _Tokens, text: str) -> str:
+    start = tokens.peek().start
+    depth = 0
+    while True:
+        token = tokens.next()
+        depth += {"<": 1, ">": -1}.get(token.text, 0)
+        if depth == 0:
+            return text[start : token.end]
+
+
+def _parse_header(tokens: _Tokens, text: str) -> list[Parameter]:
+    token = tokens.peek()
+    if token is not None and token.text == "<":
+        depth = 0
+        while True:
+            token = tokens.next()
+            depth += {"<": 1, ">": -1}.get(token.text, 0)
+            if depth == 0:
+                break
+    # Annotations, visibility and the constructor keyword before the parameters.
+    while (token := tokens.peek()) is not None:
+        if token.text == "@":
+            tokens.skip_annotation()
+        elif token.kind == "ident" and (token.text in VISIBILITY_MODIFIERS or token.text == "constructor"):
+            tokens.next()
+        else:
+            break
+    if token is None or token.text != "(":
+        return []
+    tokens.next()
+
+    parameters = []
+    while True:
+        token = tokens.peek()
+        if token is None:
+            raise Exception("Unterminated constructor")
+        if token.text == ")":
+            tokens.next()
+            return parameters
+        parameters.append(_parse_parameter(tokens, text))
+        if tokens.peek() is not None and tokens.peek().text == ",":
+            tokens.next()
+
+
+def _parse_parameter(tokens: _Tokens, text: str) -> Parameter:
+    modifiers, binding = [], None
+    while True:
+        token = tokens.peek()
+        if token.text == "@":
+            tokens.skip_annotation()
+        elif token.kind == "ident" and token.text in PARAMETER_MODIFIERS:
+            modifiers.append(tokens.next().text)
+        elif token.kind == "ident" and token.text in ("val", "var"):
+            binding = tokens.next().text
+        else:
+            break
+
+    name = tokens.next()
+    if name.kind != "ident":
+        raise Exception(f"Expected a parameter name at offset {name.start}, got {name.text!r}")
+    colon = tokens.next()
+    if colon.text != ":":
+        raise Exception(f"Expected ':' after parameter {name.text!r}")
+
+    type_text = _read_until(tokens, text, ("=", ",", ")"), angles=True)
+    default = None
+    if tokens.peek().text == "=":
+        tokens.next()
+        default = _read_until(tokens, text, (",", ")"), angles=False)
+
+    visibility = next((modifier for modifier in modifiers if modifier in VISIBILITY_MODIFIERS), None)
+    return Parameter(name.text, type_text, default, visibility, binding, tuple(modifiers))
+
+
+def _read_until(
+    tokens: _Tokens, text: str, stops: tuple[str, ...], angles: bool, statement: bool = False
+) -> str:
+    # Source text up to the first top-level stop token (not consumed). In a
+    # statement, a line break that doesn't continue the expression stops too.
+    start = end = None
+    depth = 0
+    while True:
+        token = tokens.peek()
+        if token is None:
+            raise Exception("Unterminated declaration")
+        if (
+            statement
+            and depth == 0
+            and end is not None
+            and "\n" in text[end : token.start]
+            and text[end - 1] not in ",.:<-"
+            and token.text not in (".", "?", "-", ":")
+        ):
+            break
+        if token.text in _OPENING and token.text not in stops:
+            closing = tokens.skip_balanced()
+            start = token.start if start is None else start
+            end = closing.end
+            continue
+        if angles and token.text in "<>" and token.kind == "punct":
+            # `->` in function types isn't a closing angle bracket.
+            if not (token.text == ">" and end is not None and text[end - 1] == "-" and end == token.start):
+                depth += 1 if token.text == "<" else -1
+        elif depth == 0 and token.text in stops:
+            break
+        tokens.next()
+        start = token.start if start is None else start
+        end = token.end
+    if start is None:
+        raise Exception("Expected a type or value")
+    return text[start:end].strip()
@@ -0,0 +1,36 @@
+from typing import Iterable
+
+# Same layout as the extensions repos: everything else, then java, javax and kotlin.
+_IMPORT_GROUPS = ("java.", "javax.", "kotlin.")
+
+
+def _import_order(name: str) -> tuple[int, str]:
+    for group, prefix in enumerate(_IMPORT_GROUPS, 1):
+        if name.startswith(prefix):
+            return group, name
+    return 0, name
+
+
+def import_block(imports: Iterable[str], indent: str = "") -> str:
+    return "\n".join(f"{indent}import {name}" for name in sorted(set(imports), key=_import_order))
+
+
+def string_literal(value: str) -> str:
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("$", "\\$")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+def region(name: str, lines: list[str]) -> list[str]:
+    # Owned by the scaffolder: `creator.py reconcile` replaces it even in hand-edited files.
+    return [f"// region scaffolder:{name}", *lines, "// endregion"] if lines else []
+
+
+def indent_lines(lines: Iterable[str], indent: str) -> str:
+    return "\n".join(indent + line if line else line for line in lines)
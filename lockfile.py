@@ -0,0 +1,131 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from options import ScaffoldOptions, read_sample
+from writer import write_atomic
+
+LOCK_FILE = "scaffolder.lock"
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+class Lockfile:
+    # The inputs of every generated source and the hashes of the files as they
+    # were rendered, one JSON object per line and module so it diffs (and
+    # merges) well in git. Read by `creator.py reconcile`.
+    def __init__(self, root: str | Path = "."):
+        self.root = Path(root)
+        self.path = self.root / LOCK_FILE
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = self.load()
+        # Recorded entries not saved yet, see flush.
+        self.dirty = False
+
+    def load(self) -> dict[str, dict]:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return {}
+        entries = {}
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                entries[entry["path"]] = entry
+            except (ValueError, KeyError, TypeError):
+                raise Exception(f"Invalid {LOCK_FILE} entry at line {number}")
+        return entries
+
+    def save(self):
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for _, entry in sorted(self.entries.items()))
+        write_atomic(self.path, data.encode("utf-8"))
+
+    def flush(self):
+        # Saves once for a whole run instead of once per source.
+        with self.lock:
+            if self.dirty:
+                self.save()
+                self.dirty = False
+
+    def record(self, scaffold, files: Iterable[tuple[str, str]]):
+        entry = {
+            "path": scaffold.package_path,
+            "kind": scaffold.kind,
+            "name": scaffold.name,
+            "lang": ",".join(scaffold.languages),
+            "base_url": scaffold.baseUrl,
+            "is_parsed": scaffold.is_parsed,
+            "theme": scaffold.theme,
+            "options": self.options_entry(scaffold.options),
+            "files": file_hashes(scaffold.package_path, files),
+        }
+        with self.lock:
+            self.entries[entry["path"]] = entry
+            self.dirty = True
+
+    def options_entry(self, options: ScaffoldOptions) -> dict:
+        data = options.to_dict()
+        files = dict(data.pop("sample_files", ()))
+        if "sample_json" in data:
+            # The responses can be large: only where they were read from and their hash.
+            data["sample_json"] = [
+                [endpoint, {"path": self.relative(files.get(endpoint)), "hash": content_hash(sample)}]
+                for endpoint, sample in data["sample_json"]
+            ]
+        return data
+
+    def relative(self, path: str | None) -> str | None:
+        if path is None:
+            return None  # Not read from a file (server, library), can't be re-read.
+        path = Path(path).resolve()
+        return path.relative_to(self.root).as_posix() if path.is_relative_to(self.root) else str(path)
+
+    def options_of(self, entry: dict) -> ScaffoldOptions:
+        # The inverse of options_entry, re-reads the samples.
+        data = dict(entry["options"])
+        samples, files = [], []
+        for endpoint, sample in data.pop("sample_json", ()):
+            if sample["path"] is None:
+                raise Exception(f"the {endpoint} sample wasn't read from a file, scaffold it again with --sample-json")
+            path = self.root / sample["path"]
+            try:
+                samples.append((endpoint, read_sample(path)))
+            except OSError:
+                raise Exception(f"missing {endpoint} sample: {sample['path']}")
+            files.append((endpoint, os.fspath(path)))
+        return ScaffoldOptions.from_dict({**data, "sample_json": samples, "sample_files": files})
+
+
+def file_hashes(package_path: str, files: Iterable[tuple[str, str]]) -> dict[str, str]:
+    # Keyed by the path inside the module.
+    return {path.removeprefix(package_path + "/"): content_hash(content) for path, content in files}
+
+
+_lockfiles: dict[Path, Lockfile] = {}
+_lockfiles_lock = threading.Lock()
+
+
+def get_lockfile(root: str | Path = ".") -> Lockfile:
+    key = Path(root).resolve()
+    with _lockfiles_lock:
+        if not _lockfiles:
+            # Library callers of scaffold() may never flush.
+            atexit.register(flush_all)
+        if key not in _lockfiles:
+            _lockfiles[key] = Lockfile(key)
+        return _lockfiles[key]
+
+
+def flush_all():
+    with _lockfiles_lock:
+        lockfiles = list(_lockfiles.values())
+    for lockfile in lockfiles:
+        lockfile.flush()
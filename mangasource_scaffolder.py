@@ -1,8 +1,20 @@
+from pathlib import Path
 from textwrap import dedent
+from typing import Iterable
 from animesource_scaffolder import AnimeSourceScaffolder
+from kotlin_syntax import import_block
+from options import ScaffoldOptions
+from profiling import TimingHook
+from templates import template
+from translator import get_translator
 
 
 class MangaSourceScaffolder(AnimeSourceScaffolder):
+    kind = "manga"
+    default_rate_limit = "default"
+    source_factory = ("eu.kanade.tachiyomi.source", "SourceFactory", "Source")
+    configurable_source = "eu.kanade.tachiyomi.source.ConfigurableSource"
+
     def __init__(
         self,
         is_parsed: bool,
@@ -10,8 +22,13 @@ class MangaSourceScaffolder(AnimeSourceScaffolder):
         lang: str,
         baseUrl: str,
         theme: str | None = None,
+        options: ScaffoldOptions | None = None,
+        repo_root: str | Path = ".",
+        timing_hooks: Iterable[TimingHook] = (),
     ):
-        super().__init__(is_parsed, name, lang, baseUrl, theme)
+        super().__init__(is_parsed, name, lang, baseUrl, theme, options, repo_root, timing_hooks)
+        if any(key == "videos" for key, _ in self.options.selectors):
+            raise Exception("The videos selector is only supported by anime sources.")
         self.package_line = "package eu.kanade.tachiyomi.extension." + self.package_id
         self.sources_path = f"{self.package_path}/src/eu/kanade/tachiyomi/extension/{self.short_lang}/{self.package}"
 
@@ -23,189 +40,227 @@ class MangaSourceScaffolder(AnimeSourceScaffolder):
         ("anime", "manga"),
     )
 
+    # Used for the documents that are shared as a whole (manifest, url handler).
+    url_replace_map = (
+        (".tachiyomi.anime", ".tachiyomi."),
+        ("/anime/", "/manga/"),
+        ("ANIMESEARCH", "SEARCH"),
+        ("Aniyomi", "Tachiyomi"),
+    )
+
     @property
+    def concurrent_hosters(self) -> bool:
+        return False  # No videos here.
+
+    @template
     def android_manifest(self) -> str:
-        return super().android_manifest.replace("/anime/", "/manga/")
+        return get_translator(self.url_replace_map)(super().android_manifest)
 
     def convert_to_manga(self, input: str) -> str:
-        output = input
-        for previous, new in self.replace_map:
-            output = output.replace(previous, new)
-        return output
-
-    def _theme_class(self, args: str) -> str:
-        head = (
-            dedent(
-                f"""
-        {self.package_line}
+        return self.translate(input)
 
-        import eu.kanade.tachiyomi.multisrc.{self.theme_pkg}.{self.theme}
-        import eu.kanade.tachiyomi.network.interceptor.rateLimitHost
-        import okhttp3.HttpUrl.Companion.toHttpUrl
+    @template
+    def http_source_screens(self) -> str:
+        return self.convert_to_manga(super().http_source_screens)
 
-        class {self.className} : {self.theme}
-        """[1:]
-            )[:-1]
-            + f"({args}) "
-        )
-        body = dedent(
-            """
-        {
-            override val client = network.client.newBuilder()
-                .rateLimitHost(baseUrl.toHttpUrl(), 2)
-                .build()
-        }"""[1:]
-        )
+    @property
+    def request_imports(self) -> set[str]:
+        if self.options.coroutines:
+            return {"eu.kanade.tachiyomi.network.awaitSuccess"}
+        return {"eu.kanade.tachiyomi.network.asObservableSuccess", "rx.Observable"}
+
+    @property
+    def episode_list_fetch(self) -> str:
+        if not self.options.coroutines or self.options.paginated_episodes:
+            return super().episode_list_fetch
+        return """
+            override suspend fun getChapterList(manga: SManga): List<SChapter> {
+                return client.newCall(chapterListRequest(manga))
+                    .awaitSuccess()
+                    .use(::chapterListParse)
+            }
 
-        return head + body
+"""[1:]
 
     @property
-    def http_source_screens(self) -> str:
-        return self.convert_to_manga(super().http_source_screens)
+    def paginated_episode_list_fetch(self) -> str:
+        if self.options.coroutines:
+            return super().paginated_episode_list_fetch
+        # The Rx flavour, so the class doesn't mix suspend and Observable overrides.
+        use = " { chapterListPageParse(it.asJsoup()) }" if self.is_parsed else "(::chapterListPageParse)"
+        return f"""
+            override fun fetchChapterList(manga: SManga): Observable<List<SChapter>> {{
+                return client.newCall(chapterListRequest(manga))
+                    .asObservableSuccess()
+                    .map {{ response -> response.use{use} }}
+                    .concatMap {{ firstPage ->
+                        // The remaining pages are fetched concurrently (still within the client's
+                        // rate limit), then merged back in page order.
+                        Observable.range(2, maxOf(firstPage.lastPage - 1, 0))
+                            .concatMapEager(
+                                {{ page ->
+                                    client.newCall(chapterListPageRequest(manga, page))
+                                        .asObservableSuccess()
+                                        .map {{ response -> response.use{use} }}
+                                        .subscribeOn(Schedulers.io())
+                                }},
+                                LIST_PAGE_CONCURRENCY,
+                                LIST_PAGE_CONCURRENCY,
+                            )
+                            .startWith(firstPage)
+                            .toList()
+                            .map {{ pages -> pages.flatMap {{ it.chapters }} }}
+                    }}
+            }}
+
+"""[1:]
+
+    @property
+    def episode_list_imports(self) -> set[str]:
+        if self.options.paginated_episodes and not self.options.coroutines:
+            # Observable and asObservableSuccess come with the Rx request_imports.
+            return {"rx.schedulers.Schedulers"}
+        return super().episode_list_imports
 
     @property
+    def page_list_fetch(self) -> str:
+        if not self.options.coroutines:
+            return ""
+        use = " { pageListParse(it.asJsoup()) }" if self.is_parsed else "(::pageListParse)"
+        return f"""
+            override suspend fun getPageList(chapter: SChapter): List<Page> {{
+                return client.newCall(pageListRequest(chapter))
+                    .awaitSuccess()
+                    .use{use}
+            }}
+
+"""[1:]
+
+    @template
     def http_source_catalogues(self) -> str:
-        return """
+        return f"""
             // =============================== Pages ================================
-            override fun pageListParse(response: Response): List<Page> {
+{self.page_list_fetch}            override fun pageListParse(response: Response): List<Page> {{
                 throw UnsupportedOperationException()
-            }
+            }}
 
-            override fun imageUrlParse(response: Response): String {
+            override fun imageUrlParse(response: Response): String {{
                 throw UnsupportedOperationException()
-            }"""[1:]
+            }}"""[1:]
 
     @property
+    def http_source_imports(self) -> set[str]:
+        return {
+            "eu.kanade.tachiyomi.network.GET",
+            "eu.kanade.tachiyomi.source.model.FilterList",
+            "eu.kanade.tachiyomi.source.model.MangasPage",
+            "eu.kanade.tachiyomi.source.model.Page",
+            "eu.kanade.tachiyomi.source.model.SChapter",
+            "eu.kanade.tachiyomi.source.model.SManga",
+            "eu.kanade.tachiyomi.source.online.HttpSource",
+            "okhttp3.Request",
+            "okhttp3.Response",
+            *self.client_imports,
+            *self.request_imports,
+            *self.episode_list_imports,
+            *self.json_imports,
+        }
+
+    @template
     def http_source(self) -> str:
         return dedent(
             f"""
         {self.package_line}
 
-        import eu.kanade.tachiyomi.network.GET
-        import eu.kanade.tachiyomi.network.asObservableSuccess
-        import eu.kanade.tachiyomi.network.interceptor.rateLimitHost
-        import eu.kanade.tachiyomi.source.model.FilterList
-        import eu.kanade.tachiyomi.source.model.MangasPage
-        import eu.kanade.tachiyomi.source.model.Page
-        import eu.kanade.tachiyomi.source.model.SChapter
-        import eu.kanade.tachiyomi.source.model.SManga
-        import eu.kanade.tachiyomi.source.online.HttpSource
-        import kotlinx.serialization.json.Json
-        import kotlinx.serialization.json.decodeFromStream
-        import okhttp3.HttpUrl.Companion.toHttpUrl
-        import okhttp3.Request
-        import okhttp3.Response
-        import rx.Observable
-        import uy.kohesive.injekt.injectLazy
-
-        class {self.className} : HttpSource() {{
+{import_block(self.http_source_imports, " " * 8)}
+
+        {self.class_declaration()} : HttpSource(){self.source_interfaces} {{
 
             override val name = "{self.name}"
 
             override val baseUrl = "{self.baseUrl}"
 
-            override val lang = "{self.lang}"
-
-            override val supportsLatest = false
+{self.lang_property}            override val supportsLatest = false
 
-            override val client = network.client.newBuilder()
-                .rateLimitHost(baseUrl.toHttpUrl(), 2)
-                .build()
-
-            private val json: Json by injectLazy()
-
-{self.http_source_screens}
+{self.client_override}{self.json_property}{self.http_source_screens}
 
 {self.http_source_catalogues}
 
-            // ============================= Utilities ==============================
-            private inline fun <reified T> Response.parseAs(): T = use {{
-                json.decodeFromStream(it.body.byteStream())
-            }}
-
-            companion object {{
-                const val PREFIX_SEARCH = "id:"
-            }}
+{self.settings}{self.parse_as_helper}{self.companion_object}
         }}
         """[1:]
         )
 
-    @property
+    @template
     def parsed_http_source_screens(self) -> str:
         return self.convert_to_manga(super().parsed_http_source_screens)
 
-    @property
+    @template
     def parsed_http_source_catalogues(self) -> str:
-        return """
+        return f"""
             // =============================== Pages ================================
-            override fun pageListParse(document: Document): List<Page> {
+{self.page_list_fetch}            override fun pageListParse(document: Document): List<Page> {{
                 throw UnsupportedOperationException()
-            }
+            }}
 
-            override fun imageUrlParse(document: Document): String {
+            override fun imageUrlParse(document: Document): String {{
                 throw UnsupportedOperationException()
-            }"""[1:]
+            }}"""[1:]
 
     @property
+    def parsed_http_source_imports(self) -> set[str]:
+        return {
+            "eu.kanade.tachiyomi.network.GET",
+            "eu.kanade.tachiyomi.source.model.FilterList",
+            "eu.kanade.tachiyomi.source.model.MangasPage",
+            "eu.kanade.tachiyomi.source.model.Page",
+            "eu.kanade.tachiyomi.source.model.SChapter",
+            "eu.kanade.tachiyomi.source.model.SManga",
+            "eu.kanade.tachiyomi.source.online.ParsedHttpSource",
+            "eu.kanade.tachiyomi.util.asJsoup",
+            "okhttp3.Request",
+            "okhttp3.Response",
+            "org.jsoup.nodes.Document",
+            "org.jsoup.nodes.Element",
+            *self.client_imports,
+            *self.request_imports,
+            *self.episode_list_imports,
+            *self.selector_imports,
+        }
+
+    @template
     def parsed_http_source(self) -> str:
         return dedent(
             f"""
         {self.package_line}
 
-        import eu.kanade.tachiyomi.network.GET
-        import eu.kanade.tachiyomi.network.asObservableSuccess
-        import eu.kanade.tachiyomi.network.interceptor.rateLimitHost
-        import eu.kanade.tachiyomi.source.model.FilterList
-        import eu.kanade.tachiyomi.source.model.MangasPage
-        import eu.kanade.tachiyomi.source.model.Page
-        import eu.kanade.tachiyomi.source.model.SChapter
-        import eu.kanade.tachiyomi.source.model.SManga
-        import eu.kanade.tachiyomi.source.online.ParsedHttpSource
-        import eu.kanade.tachiyomi.util.asJsoup
-        import okhttp3.HttpUrl.Companion.toHttpUrl
-        import okhttp3.Request
-        import okhttp3.Response
-        import org.jsoup.nodes.Document
-        import org.jsoup.nodes.Element
-        import rx.Observable
-
-        class {self.className} : ParsedHttpSource() {{
+{import_block(self.parsed_http_source_imports, " " * 8)}
+
+        {self.class_declaration()} : ParsedHttpSource(){self.source_interfaces} {{
 
             override val name = "{self.name}"
 
             override val baseUrl = "{self.baseUrl}"
 
-            override val lang = "{self.lang}"
-
-            override val supportsLatest = false
+{self.lang_property}            override val supportsLatest = false
 
-            override val client = network.client.newBuilder()
-                .rateLimitHost(baseUrl.toHttpUrl(), 2)
-                .build()
-
-{self.parsed_http_source_screens}
+{self.client_override}{self.parsed_http_source_screens}
 
 {self.parsed_http_source_catalogues}
 
-            companion object {{
-                const val PREFIX_SEARCH = "id:"
-            }}
+{self.settings}{self.companion_object}
         }}
         """[1:]
         )
 
-    @property
+    @template
     def url_handler(self) -> str:
-        return (
-            super()
-            .url_handler.replace(".tachiyomi.anime", ".tachiyomi.")
-            .replace("/anime/", "/manga/")
-            .replace("ANIMESEARCH", "SEARCH")
-            .replace("Aniyomi", "Tachiyomi")
-        )
+        return get_translator(self.url_replace_map)(super().url_handler)
 
-    @property
+    @template
     def url_handler_search(self) -> str:
+        if self.options.coroutines:
+            return self.translate(super().url_handler_search)
         return f"""
             override fun fetchSearchManga(page: Int, query: String, filters: FilterList): Observable<MangasPage> {{
                 return if (query.startsWith(PREFIX_SEARCH)) {{ // URL intent handler
@@ -224,5 +279,18 @@ class MangaSourceScaffolder(AnimeSourceScaffolder):
                         setUrlWithoutDomain(response.request.url.toString())
                         initialized = true
                     }}
-                return MangasPage(listOf(details), false)
-            }}"""[1:]
+{"                cacheDetails(details)" + chr(10) if self.options.details_cache else ""}                return MangasPage(listOf(details), false)
+            }}{self.details_cache}"""[1:]
+
+    @template
+    def details_cache(self) -> str:
+        return self.translate(super().details_cache)
+
+    @property
+    def cached_details_override(self) -> str:
+        if self.options.coroutines:
+            return self.translate(super().cached_details_override)
+        return """
+            override fun fetchMangaDetails(manga: SManga): Observable<SManga> {
+                return cachedDetails(manga)?.let { Observable.just(it) } ?: super.fetchMangaDetails(manga)
+            }"""[1:]
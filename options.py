@@ -0,0 +1,131 @@
+import json
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+# Requests per second allowed to the baseUrl host and to each CDN host.
+RATE_LIMIT_PROFILES = {
+    "strict": (1, 5),
+    "default": (2, 10),
+    "relaxed": (5, 25),
+}
+
+# Endpoints accepted by --sample-json, with the base name of their root DTO.
+SAMPLE_ENDPOINTS = {
+    "popular": "Popular",
+    "latest": "Latest",
+    "search": "Search",
+    "details": "AnimeDetails",
+    "episodes": "EpisodeList",
+}
+SAMPLE_ENDPOINT_ALIASES = {"chapters": "episodes"}
+
+
+def read_sample(file: str | Path) -> str:
+    # Re-serialized, so the same response always renders (and hashes) the same.
+    with open(file, encoding="utf-8") as f:
+        return json.dumps(json.load(f))
+
+# Selectors accepted by --selector/--selectors, with the (anime) name of their
+# ParsedHttpSource method without the "Selector" suffix.
+SELECTORS = {
+    "popular": "popularAnime",
+    "popular_next": "popularAnimeNextPage",
+    "latest": "latestUpdates",
+    "latest_next": "latestUpdatesNextPage",
+    "search": "searchAnime",
+    "search_next": "searchAnimeNextPage",
+    "episodes": "episodeList",
+    "videos": "videoList",
+}
+SELECTOR_ALIASES = {"chapters": "episodes"}
+
+
+@dataclass(frozen=True)
+class ScaffoldOptions:
+    # Generation options shared by every source of a run. They are part of the
+    # template variant, so they must stay hashable (tuples, not lists).
+    disk_cache: int | None = None
+    connection_pool: int | None = None
+    keep_alive: int | None = None
+    rate_limit: str | None = None
+    cdn_hosts: tuple[str, ...] = ()
+    # EventListener logging the timings of every request, behind a debug preference.
+    request_timing: bool = False
+    # Anime only, manga sources have no video hosters.
+    concurrent_hosters: bool = False
+    hoster_timeout: int = 20
+    preferred_quality: str | None = None
+    preferred_hosters: tuple[str, ...] = ()
+    # Episode/chapter lists split across pages, fetched page_concurrency at a time.
+    paginated_episodes: bool = False
+    page_concurrency: int = 4
+    # Manga only: suspend overrides using awaitSuccess instead of Rx Observables.
+    coroutines: bool = False
+    # Search-by-id details kept for the details request that follows, max entries and seconds.
+    details_cache: int | None = None
+    details_cache_ttl: int = 300
+    # (endpoint, raw JSON response) pairs.
+    sample_json: tuple[tuple[str, str], ...] = ()
+    # (endpoint, file) the samples were read from, only recorded in the lockfile.
+    sample_files: tuple[tuple[str, str], ...] = field(default=(), compare=False)
+    # (selector, CSS query) pairs, "videos" is anime only.
+    selectors: tuple[tuple[str, str], ...] = ()
+
+    def __post_init__(self):
+        if self.rate_limit is not None and self.rate_limit not in RATE_LIMIT_PROFILES:
+            raise Exception(
+                f"Invalid rate limit profile: {self.rate_limit!r} (expected one of {', '.join(RATE_LIMIT_PROFILES)})"
+            )
+
+        if self.page_concurrency < 1:
+            raise Exception(f"Invalid page concurrency: {self.page_concurrency} (expected at least 1)")
+
+        if self.details_cache is not None and self.details_cache < 1:
+            raise Exception(f"Invalid details cache size: {self.details_cache} (expected at least 1)")
+
+        if self.details_cache_ttl < 1:
+            raise Exception(f"Invalid details cache TTL: {self.details_cache_ttl} (expected at least 1)")
+
+        for endpoint, _ in self.sample_json:
+            if endpoint not in SAMPLE_ENDPOINTS:
+                raise Exception(
+                    f"Invalid sample endpoint: {endpoint!r} (expected one of {', '.join(SAMPLE_ENDPOINTS)})"
+                )
+
+        for selector, _ in self.selectors:
+            if selector not in SELECTORS:
+                raise Exception(
+                    f"Invalid selector: {selector!r} (expected one of {', '.join(SELECTORS)})"
+                )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScaffoldOptions":
+        names = {field.name for field in fields(cls)}
+        unknown = set(data) - names
+        if unknown:
+            raise Exception(f"Unknown options: {', '.join(sorted(unknown))}")
+        return cls(
+            **{
+                key: tuple(tuple(item) if isinstance(item, list) else item for item in value)
+                if isinstance(value, list)
+                else tuple(value.items())
+                if isinstance(value, dict)
+                else value
+                for key, value in data.items()
+                if value is not None
+            }
+        )
+
+    def to_dict(self) -> dict:
+        # Only the non-default options, the inverse of from_dict.
+        return {
+            field.name: getattr(self, field.name)
+            for field in fields(self)
+            if getattr(self, field.name) != field.default
+        }
+
+    @property
+    def tunes_client(self) -> bool:
+        return any(
+            (self.disk_cache, self.connection_pool, self.keep_alive, self.rate_limit, self.cdn_hosts)
+        )
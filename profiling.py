@@ -0,0 +1,80 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterable, Iterator, TextIO
+
+# A timing event: {"phase", "source", "seconds", "pid", ...phase fields}.
+TimingHook = Callable[[dict], None]
+
+
+class JsonLinesHook:
+    # One JSON object per line, flushed whole so the file can be followed live.
+    def __init__(self, file: TextIO):
+        self.file = file
+
+    def __call__(self, event: dict):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+
+
+@contextlib.contextmanager
+def timed(hooks: tuple[TimingHook, ...], phase: str, source: str, **fields) -> Iterator[dict]:
+    # The yielded dict can be filled with fields only known at the end.
+    if not hooks:
+        yield fields
+        return
+    error = None
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        raise
+    finally:
+        event = {
+            "phase": phase,
+            "source": source,
+            "seconds": time.perf_counter() - start,
+            "pid": os.getpid(),
+            **fields,
+        }
+        if error is not None:
+            event["error"] = error
+        for hook in hooks:
+            hook(event)
+
+
+def replay(events: list[dict], hooks: Iterable[TimingHook]):
+    # Events recorded by a worker (see the `timed` flag of batch.render_row).
+    for event in events:
+        for hook in hooks:
+            hook(event)
+
+
+@contextlib.contextmanager
+def profiled(cprofile: str | None = None, memory_top: int | None = None):
+    # cProfile only sees this process: batch workers are not included.
+    profile = cProfile.Profile() if cprofile is not None else None
+    if memory_top:
+        tracemalloc.start()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+        if memory_top:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"\nPeak memory: {peak / 1024:.1f} KiB, top allocations:", file=sys.stderr)
+            for stat in snapshot.statistics("lineno")[:memory_top]:
+                print(f"  {stat}", file=sys.stderr)
+        if profile is not None:
+            profile.dump_stats(cprofile)
+            print(f"cProfile stats written to {cprofile}", file=sys.stderr)
@@ -0,0 +1,147 @@
+import os
+import re
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from kotlin_syntax import import_block
+from lockfile import content_hash, get_lockfile
+from scaffolding import SourceSpec, render
+from theme_index import get_theme_index
+from writer import IncrementalWriter
+
+_REGION = re.compile(r"^[ \t]*// region scaffolder:(\S+)\n.*?^[ \t]*// endregion\n", re.MULTILINE | re.DOTALL)
+_IMPORT = re.compile(r"^import (\S+)\n", re.MULTILINE)
+
+
+def merge_regions(current: str, rendered: str) -> str:
+    # Hand-edited file: only the scaffolder's regions are replaced, and the
+    # imports the new render needs are added. Everything else is kept.
+    regions = {match[1]: match[0] for match in _REGION.finditer(rendered)}
+    merged = _REGION.sub(lambda match: regions.get(match[1], ""), current)
+
+    imports = _IMPORT.findall(merged)
+    missing = set(_IMPORT.findall(rendered)) - set(imports)
+    if not missing or not imports:
+        return merged
+    lines = list(_IMPORT.finditer(merged))
+    start, end = lines[0].start(), lines[-1].end()
+    if all(line.startswith("import ") for line in merged[start:end].splitlines() if line):
+        return merged[:start] + import_block([*imports, *missing]) + "\n" + merged[end:]
+    return merged[:end] + import_block(missing) + "\n" + merged[end:]
+
+
+def render_entry(entry: dict, repo_root: str | Path = "."):
+    # Runs inside the worker processes, so it must stay a module-level function.
+    try:
+        spec = SourceSpec(
+            entry["kind"],
+            entry["name"],
+            entry["lang"],
+            entry["base_url"],
+            entry["is_parsed"],
+            entry["theme"],
+            get_lockfile(repo_root).options_of(entry),
+        )
+        return render(spec, repo_root), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def reconcile_file(root: Path, entry: dict, path: str, content: str, writer: IncrementalWriter) -> tuple[str, str | None]:
+    # The status and the content the file has now (None when it is missing).
+    name = path.removeprefix(entry["path"] + "/")
+    try:
+        current = (root / path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        if name in entry["files"]:
+            return "missing", None  # Deleted on purpose, leave it deleted.
+        writer.write(path, content)
+        return "created", content
+    if current == content:
+        return "unchanged", content
+    if name not in entry.get("edited", ()) and content_hash(current) == entry["files"].get(name):
+        # Still as generated, take the new render as a whole.
+        writer.write(path, content)
+        return "updated", content
+    # Edited by hand, now or in a previous run (the hash then matches the merge).
+    merged = merge_regions(current, content)
+    if merged == current:
+        return "kept", current
+    writer.write(path, merged)
+    return "merged", merged
+
+
+def reconcile(
+    repo_root: str | Path = ".",
+    jobs: int | None = None,
+    dry_run: bool = False,
+    modules: list[str] | None = None,
+) -> bool:
+    root = Path(repo_root).resolve()
+    lockfile = get_lockfile(root)
+    entries = [
+        entry
+        for path, entry in sorted(lockfile.entries.items())
+        if not modules or path in modules or path.rstrip("/") in modules
+    ]
+    jobs = jobs or os.cpu_count() or 1
+    themes = {entry["theme"] for entry in entries if entry.get("theme")}
+    if themes:
+        # Built once, forked workers inherit it (or read its cache).
+        index = get_theme_index(root)
+        for theme in themes & index.themes.keys():
+            index.abstract_members(theme)
+
+    executor: Executor | None = ProcessPoolExecutor(jobs) if jobs > 1 and len(entries) > 1 else None
+    writer = IncrementalWriter(dry_run=dry_run, root=root)
+    summary = []
+    try:
+        render = partial(render_entry, repo_root=root)
+        if executor is None:
+            rendered = map(render, entries)
+        else:
+            rendered = executor.map(render, entries, chunksize=max(1, len(entries) // (jobs * 4)))
+
+        for entry, (files, error) in zip(entries, rendered):
+            if error is not None:
+                summary.append((entry["path"], None, error))
+                continue
+            statuses, hashes, edited = Counter(), {}, set()
+            for path, content in files:
+                name = path.removeprefix(entry["path"] + "/")
+                status, current = reconcile_file(root, entry, path, content, writer)
+                statuses[status] += 1
+                # What is on disk now, so the next run can tell whether it changed.
+                hashes[name] = entry["files"][name] if current is None else content_hash(current)
+                if status in ("merged", "kept"):
+                    edited.add(name)
+            summary.append((entry["path"], statuses, None))
+            if not dry_run:
+                if entry["options"].get("sample_json"):
+                    # The samples were re-read, record the hashes of what was rendered.
+                    entry["options"] = lockfile.options_entry(lockfile.options_of(entry))
+                with lockfile.lock:
+                    entry["files"] = hashes
+                    if edited:
+                        entry["edited"] = sorted(edited)
+                    else:
+                        entry.pop("edited", None)
+                    lockfile.dirty = True
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if not dry_run:
+        lockfile.flush()
+
+    print()
+    for path, statuses, error in summary:
+        if error is not None:
+            print(f"FAIL {path}: {error}")
+        else:
+            print(f"OK   {path}: " + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+    failures = sum(error is not None for _, _, error in summary)
+    print(f"\n{len(summary) - failures} reconciled, {failures} failed.")
+    print(f"Files: {writer.report}")
+    return not failures
@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from writer import write_atomic
+
+CACHE_FILE = "build/scaffolder/repo-index.json"
+CACHE_VERSION = 1
+
+_GRADLE_PROPERTY = re.compile(
+    r"""^\s*(\w+)\s*=\s*(?:'([^']*)'|"([^"]*)"|(\d+))""", re.MULTILINE
+)
+_MANIFEST_HOST = re.compile(r'android:host="([^"]+)"')
+
+
+def normalize_host(url_or_host: str) -> str:
+    host = urlsplit(url_or_host if "://" in url_or_host else "//" + url_or_host).hostname or ""
+    return host.removeprefix("www.")
+
+
+@dataclass
+class ExtensionEntry:
+    package_id: str
+    path: str
+    stamp: list = field(default_factory=list)
+    properties: dict[str, str] = field(default_factory=dict)
+    hosts: list[str] = field(default_factory=list)
+
+    @property
+    def ext_name(self) -> str | None:
+        return self.properties.get("extName")
+
+    @property
+    def ext_class(self) -> str | None:
+        ext_class = self.properties.get("extClass")
+        return ext_class.removeprefix(".") if ext_class else None
+
+
+def _stamp(*files: Path) -> list:
+    stamp = []
+    for file in files:
+        try:
+            stat = file.stat()
+            stamp.append([stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+
+class RepoIndex:
+    # Existing extensions of the repository (src/<lang>/<pkg>), used to detect
+    # collisions before scaffolding without grepping the whole repo.
+    def __init__(self, root: str | Path = "."):
+        self.root = Path(root)
+        self.cache_path = self.root / CACHE_FILE
+        self.extensions: dict[str, ExtensionEntry] = {}
+        self.classes: dict[str, set[str]] = {}
+        self.hosts: dict[str, set[str]] = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, package_id: str) -> bool:
+        return package_id in self.extensions
+
+    def __len__(self) -> int:
+        return len(self.extensions)
+
+    def get(self, package_id: str) -> ExtensionEntry | None:
+        return self.extensions.get(package_id)
+
+    def modules(self):
+        src = self.root / "src"
+        if not src.is_dir():
+            return
+        for lang in os.scandir(src):
+            if not lang.is_dir():
+                continue
+            for module in os.scandir(lang.path):
+                if module.is_dir():
+                    yield f"{lang.name}.{module.name}", Path(module.path)
+
+    def load(self) -> dict[str, ExtensionEntry]:
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            if data.get("version") != CACHE_VERSION:
+                return {}
+            return {
+                package_id: ExtensionEntry(**entry)
+                for package_id, entry in data["extensions"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def save(self):
+        data = {
+            "version": CACHE_VERSION,
+            "extensions": {
+                package_id: asdict(entry)
+                for package_id, entry in sorted(self.extensions.items())
+            },
+        }
+        write_atomic(self.cache_path, json.dumps(data).encode("utf-8"))
+
+    def scan(self, package_id: str, path: Path, cached: ExtensionEntry | None) -> ExtensionEntry:
+        gradle, manifest = path / "build.gradle", path / "AndroidManifest.xml"
+        stamp = _stamp(gradle, manifest)
+        if cached is not None and cached.stamp == stamp:
+            return cached
+
+        entry = ExtensionEntry(package_id, path.relative_to(self.root).as_posix(), stamp)
+        if stamp[0] is not None:
+            for match in _GRADLE_PROPERTY.finditer(gradle.read_text(encoding="utf-8")):
+                key, *values = match.groups()
+                entry.properties[key] = next(value for value in values if value is not None)
+        if stamp[1] is not None:
+            entry.hosts = _MANIFEST_HOST.findall(manifest.read_text(encoding="utf-8"))
+        return entry
+
+    def refresh(self, jobs: int | None = None) -> "RepoIndex":
+        with self.lock:
+            cached = self.extensions or self.load()
+            modules = list(self.modules())
+            with ThreadPoolExecutor(jobs) as executor:
+                entries = list(
+                    executor.map(
+                        lambda module: self.scan(*module, cached.get(module[0])), modules
+                    )
+                )
+            self.extensions = {entry.package_id: entry for entry in entries}
+            self.classes, self.hosts = {}, {}
+            for entry in entries:
+                self._add_lookups(entry)
+
+            changed = any(entry is not cached.get(entry.package_id) for entry in entries)
+            if changed or self.extensions.keys() != cached.keys():
+                try:
+                    self.save()
+                except OSError:
+                    pass  # The cache is only an optimization.
+        return self
+
+    def _add_lookups(self, entry: ExtensionEntry):
+        if entry.ext_class:
+            self.classes.setdefault(entry.ext_class, set()).add(entry.package_id)
+        hosts = [*entry.hosts]
+        if "baseUrl" in entry.properties:
+            hosts.append(entry.properties["baseUrl"])
+        for host in hosts:
+            if normalized := normalize_host(host):
+                self.hosts.setdefault(normalized, set()).add(entry.package_id)
+
+    def conflicts(self, scaffold) -> list[str]:
+        conflicts = []
+        if scaffold.package_id in self.extensions or (self.root / scaffold.package_path).exists():
+            conflicts.append(f"{scaffold.package_path} already exists")
+        for package_id in sorted(self.classes.get(scaffold.className, ())):
+            if package_id != scaffold.package_id:
+                conflicts.append(f"class {scaffold.className} is already used by {package_id}")
+        for package_id in sorted(self.hosts.get(normalize_host(scaffold.baseUrl), ())):
+            if package_id != scaffold.package_id:
+                conflicts.append(f"{normalize_host(scaffold.baseUrl)} is already handled by {package_id}")
+        return conflicts
+
+    def check(self, scaffold):
+        conflicts = self.conflicts(scaffold)
+        if conflicts:
+            raise Exception(
+                "Refusing to overwrite existing extensions (use --force): " + "; ".join(conflicts)
+            )
+
+    def reserve(self, scaffold):
+        # Atomic check-and-add, so concurrent scaffolds can't take the same module.
+        with self.lock:
+            self.check(scaffold)
+            entry = ExtensionEntry(
+                scaffold.package_id,
+                scaffold.package_path,
+                properties={"extName": scaffold.name, "extClass": "." + scaffold.className},
+                hosts=[scaffold.host],
+            )
+            self.extensions[entry.package_id] = entry
+            self._add_lookups(entry)
+
+    def release(self, scaffold):
+        # Undoes reserve when the module couldn't be written after all.
+        with self.lock:
+            if self.extensions.pop(scaffold.package_id, None) is None:
+                return
+            for lookup in (self.classes, self.hosts):
+                for key in [key for key, package_ids in lookup.items() if scaffold.package_id in package_ids]:
+                    lookup[key].discard(scaffold.package_id)
+                    if not lookup[key]:
+                        del lookup[key]
+
+
+_indexes: dict[Path, RepoIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_repo_index(root: str | Path = ".") -> RepoIndex:
+    key = Path(root).resolve()
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = RepoIndex(key).refresh()
+        return _indexes[key]
@@ -0,0 +1,153 @@
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Iterable
+
+from animesource_scaffolder import AnimeSourceScaffolder
+from lockfile import get_lockfile
+from mangasource_scaffolder import MangaSourceScaffolder
+from options import ScaffoldOptions
+from profiling import TimingHook, replay
+from writer import IncrementalWriter, WriteReport
+
+SCAFFOLDERS: dict[str, type[AnimeSourceScaffolder]] = {
+    "anime": AnimeSourceScaffolder,
+    "manga": MangaSourceScaffolder,
+}
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    # Everything a source is generated from, independent of the repository it
+    # is rendered for. Hashable, so it can key caches and cross executors.
+    kind: str
+    name: str
+    lang: str
+    base_url: str
+    is_parsed: bool = False
+    theme: str | None = None
+    options: ScaffoldOptions = field(default_factory=ScaffoldOptions)
+
+    def __post_init__(self):
+        if self.kind not in SCAFFOLDERS:
+            raise Exception(f"Invalid source type: {self.kind!r} (expected anime or manga)")
+
+    @classmethod
+    def from_row(cls, row: dict[str, str], options: ScaffoldOptions | None = None) -> "SourceSpec":
+        for name in ("name", "lang", "base_url"):
+            if not row.get(name):
+                raise Exception(f"Missing required field: {name}")
+
+        match row.get("type", "").lower():
+            case "anime" | "aniyomi":
+                kind = "anime"
+            case "manga" | "tachiyomi" | "mihon":
+                kind = "manga"
+            case other:
+                raise Exception(f"Invalid source type: {other!r} (expected anime or manga)")
+
+        theme = row.get("theme") or None
+        match row.get("base_class", "").lower():
+            case "parsed" | "parsedhttpsource":
+                is_parsed = True
+            case "http" | "httpsource":
+                is_parsed = False
+            case "" if theme is not None:
+                is_parsed = False
+            case other:
+                raise Exception(f"Invalid base class: {other!r} (expected http or parsed)")
+
+        return cls(kind, row["name"], row["lang"], row["base_url"], is_parsed, theme, options or ScaffoldOptions())
+
+    def scaffolder(self, repo_root: str | Path = ".", timing_hooks: Iterable[TimingHook] = ()) -> AnimeSourceScaffolder:
+        return SCAFFOLDERS[self.kind](
+            self.is_parsed, self.name, self.lang, self.base_url, self.theme, self.options, repo_root, timing_hooks
+        )
+
+
+@dataclass
+class ScaffoldResult:
+    spec: SourceSpec
+    package_path: str | None = None
+    # path -> created/updated/unchanged (would create/would update on dry runs)
+    files: dict[str, str] = field(default_factory=dict)
+    report: WriteReport = field(default_factory=WriteReport)
+    error: str | None = None
+
+
+def render(spec: SourceSpec, repo_root: str | Path = ".") -> tuple[tuple[str, str], ...]:
+    # (path relative to repo_root, content) of every file, nothing is written.
+    return spec.scaffolder(repo_root).files
+
+
+def scaffold(
+    spec: SourceSpec,
+    repo_root: str | Path = ".",
+    force: bool = False,
+    dry_run: bool = False,
+    timing_hooks: Iterable[TimingHook] = (),
+) -> ScaffoldResult:
+    timing_hooks = tuple(timing_hooks)
+    result = _write(spec, _render(spec, repo_root, bool(timing_hooks)), force, dry_run, timing_hooks)
+    get_lockfile(repo_root).flush()
+    return result
+
+
+def _render(spec: SourceSpec, repo_root: str | Path, timed: bool = False):
+    # Runs on the executor's workers, so it must stay a module-level function.
+    # The timing events are recorded and replayed by the caller (hooks may not
+    # cross processes).
+    events = []
+    try:
+        scaffolder = spec.scaffolder(repo_root, [events.append] if timed else ())
+        files = scaffolder.files
+        scaffolder.timing_hooks = ()
+        return scaffolder, files, None, events
+    except Exception as e:
+        return None, None, str(e) or e.__class__.__name__, events
+
+
+def _write(
+    spec: SourceSpec, rendered: tuple, force: bool, dry_run: bool, timing_hooks: Iterable[TimingHook] = ()
+) -> ScaffoldResult:
+    # Only records the source in the lockfile, the callers save it.
+    scaffolder, files, error, events = rendered
+    replay(events, timing_hooks)
+    result = ScaffoldResult(spec, error=error)
+    if scaffolder is None:
+        return result
+    scaffolder.timing_hooks = tuple(timing_hooks)
+    try:
+        result.package_path = scaffolder.package_path
+        writer = IncrementalWriter(verbose=False, dry_run=dry_run, root=scaffolder.repo_root)
+        scaffolder.create_dirs(writer, force)
+        result.files = scaffolder.create_files(files, writer)
+        result.report = writer.report
+    except Exception as e:
+        result.error = str(e) or e.__class__.__name__
+    return result
+
+
+def scaffold_many(
+    specs: Iterable[SourceSpec],
+    repo_root: str | Path = ".",
+    executor: Executor | None = None,
+    force: bool = False,
+    dry_run: bool = False,
+    timing_hooks: Iterable[TimingHook] = (),
+) -> list[ScaffoldResult]:
+    # Only the rendering runs on the executor (threads or processes), the repo
+    # index reservations, writes and lockfile records happen in the caller, so
+    # they are shared whatever the executor. Safe to call concurrently, for the
+    # same or different repositories: each source has its own writer.
+    specs = list(specs)
+    timing_hooks = tuple(timing_hooks)
+    run = partial(_render, repo_root=repo_root, timed=bool(timing_hooks))
+    if executor is None:
+        rendered = map(run, specs)
+    else:
+        rendered = executor.map(run, specs)
+    results = [_write(spec, result, force, dry_run, timing_hooks) for spec, result in zip(specs, rendered)]
+    get_lockfile(repo_root).flush()
+    return results
@@ -0,0 +1,520 @@
+import re
+import time
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+
+from options import SELECTORS
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+# Open tags closed by the start of another one (the usual optional end tags).
+_IMPLIED_END = {
+    "li": {"li"},
+    "option": {"option"},
+    "tr": {"tr"},
+    "td": {"td", "th", "tr"},
+    "th": {"td", "th", "tr"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "p": {"p"},
+}
+# Kept in the <head> until the first body content, as Jsoup does.
+_HEAD_TAGS = {"base", "link", "meta", "noscript", "script", "style", "template", "title"}
+_CLOSES_P = {
+    "address", "article", "aside", "blockquote", "div", "dl", "fieldset", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre",
+    "section", "table", "ul",
+}
+
+
+class Node:
+    def __init__(self, tag: str, attrs: dict[str, str], parent: "Node | None" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: list[Node] = []
+        # Own text chunks, in order.
+        self.texts: list[str] = []
+        self.index = 0
+        # Jsoup compares classes case-insensitively.
+        self.classes = set(attrs.get("class", "").lower().split())
+        if parent is not None:
+            self.index = len(parent.children)
+            parent.children.append(self)
+
+    def __iter__(self):
+        # Every element below this one, in document order.
+        stack = [*reversed(self.children)]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    @property
+    def siblings(self) -> list["Node"]:
+        return self.parent.children if self.parent is not None else [self]
+
+    @property
+    def own_text(self) -> str:
+        return " ".join(" ".join(self.texts).split())
+
+    @property
+    def text(self) -> str:
+        return " ".join(" ".join([*self.texts, *(node.text for node in self.children)]).split())
+
+
+class _TreeBuilder(HTMLParser):
+    # Like Jsoup, every document (fragments included) gets the html/head/body
+    # skeleton, so `body > ...` and `html ...` selectors match the same way.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#root", {})
+        self.html = Node("html", {}, self.root)
+        self.head = Node("head", {}, self.html)
+        self.body = Node("body", {}, self.html)
+        self.stack = [self.root, self.html, self.body]
+        self.in_body = False
+
+    def merge_attrs(self, node: Node, attrs):
+        for name, value in attrs:
+            node.attrs.setdefault(name, value or "")
+        node.classes = set(node.attrs.get("class", "").lower().split())
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("html", "head", "body"):
+            self.merge_attrs(getattr(self, tag), attrs)
+            self.in_body = self.in_body or tag == "body"
+            return
+        if not self.in_body and tag in _HEAD_TAGS and self.stack[-1] is self.body:
+            node = Node(tag, {name: value or "" for name, value in attrs}, self.head)
+            if tag not in _VOID_TAGS:
+                self.stack.append(node)
+            return
+        self.in_body = True
+        # A <tr> after an open <td> closes both the cell and the row.
+        while tag in _IMPLIED_END.get(self.stack[-1].tag, ()) or (self.stack[-1].tag == "p" and tag in _CLOSES_P):
+            self.stack.pop()
+        if tag == "tr" and self.stack[-1].tag == "table":
+            # Like Jsoup, rows are always inside a tbody (or thead/tfoot).
+            self.stack.append(Node("tbody", {}, self.stack[-1]))
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.stack[-1])
+        if tag not in _VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS and self.stack[-1].tag == tag and self.stack[-1] not in (self.html, self.head, self.body):
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        if tag in ("html", "head", "body"):
+            return  # Whatever follows still goes into the body.
+        for index in range(len(self.stack) - 1, 2, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        if data.strip():
+            self.in_body = self.in_body or self.stack[-1] is self.body
+            self.stack[-1].texts.append(data)
+
+
+def parse_html(html: str) -> Node:
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+_TOKEN = re.compile(
+    r"""
+    (?P<combinator>\s*[>+~]\s*|\s+)
+    | (?P<type>\*|[\w-]+)
+    | \#(?P<id>[\w-]+)
+    | \.(?P<cls>[\w-]+)
+    | \[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~|^$*!]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]*))\s*)?\]
+    | :(?P<pseudo>[\w-]+)
+    """,
+    re.VERBOSE,
+)
+
+
+@dataclass
+class Compound:
+    text: str
+    tag: str | None = None
+    id: str | None = None
+    classes: list[str] = field(default_factory=list)
+    # (name, operator, value), the value being a compiled regex for ~=.
+    attrs: list[tuple[str, str | None, object]] = field(default_factory=list)
+    pseudos: list[tuple[str, object]] = field(default_factory=list)
+
+
+@dataclass
+class Selector:
+    # (combinator, compound) pairs, the first combinator is None.
+    parts: list[tuple[str | None, Compound]]
+
+    def __str__(self) -> str:
+        text = self.parts[0][1].text
+        for combinator, compound in self.parts[1:]:
+            text += (" " if combinator == " " else f" {combinator} ") + compound.text
+        return text
+
+
+def _split_top_level(text: str, separator: str = ",") -> list[str]:
+    parts, depth, quote, start = [], 0, None, 0
+    for index, char in enumerate(text):
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "\"'":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _pseudo_argument(text: str, start: int) -> tuple[str, int]:
+    depth = 0
+    for index in range(start, len(text)):
+        if text[index] == "(":
+            depth += 1
+        elif text[index] == ")":
+            depth -= 1
+            if depth == 0:
+                return text[start + 1 : index], index + 1
+    raise Exception(f"Unbalanced parentheses in {text!r}")
+
+
+def _nth(argument: str) -> tuple[int, int]:
+    # an+b, odd, even -> (a, b)
+    argument = argument.replace(" ", "").lower()
+    if argument == "odd":
+        return 2, 1
+    if argument == "even":
+        return 2, 0
+    match = re.fullmatch(r"([+-]?\d*)n([+-]\d+)?|([+-]?\d+)", argument)
+    if match is None:
+        raise Exception(f"Invalid nth expression: {argument!r}")
+    if match.group(3) is not None:
+        return 0, int(match.group(3))
+    a = match.group(1)
+    a = -1 if a == "-" else 1 if a in ("", "+") else int(a)
+    return a, int(match.group(2) or 0)
+
+
+def parse_selector(text: str) -> list[Selector]:
+    selectors = []
+    for alternative in _split_top_level(text.strip()):
+        alternative = alternative.strip()
+        if not alternative:
+            raise Exception(f"Empty selector in {text!r}")
+        parts: list[tuple[str | None, Compound]] = []
+        combinator, compound, position = None, None, 0
+        while position < len(alternative):
+            match = _TOKEN.match(alternative, position)
+            if match is None:
+                raise Exception(f"Unsupported syntax at {alternative[position:]!r}")
+            if match.group("combinator") is not None:
+                if compound is None:
+                    raise Exception(f"Misplaced combinator in {alternative!r}")
+                parts.append((combinator, compound))
+                compound = None
+                combinator = match.group("combinator").strip() or " "
+                position = match.end()
+                continue
+
+            if compound is None:
+                compound = Compound("")
+                start = position
+            position = match.end()
+            if match.group("type") is not None:
+                if match.group("type") != "*":
+                    compound.tag = match.group("type").lower()
+            elif match.group("id") is not None:
+                compound.id = match.group("id")
+            elif match.group("cls") is not None:
+                compound.classes.append(match.group("cls").lower())
+            elif match.group("attr") is not None:
+                value = next((v for v in match.group("dq", "sq", "bare") if v is not None), "")
+                compound.attrs.append(_attribute(match.group("attr").lower(), match.group("op"), value))
+            else:
+                name = match.group("pseudo").lower()
+                argument = None
+                if position < len(alternative) and alternative[position] == "(":
+                    argument, position = _pseudo_argument(alternative, position)
+                compound.pseudos.append(_pseudo(name, argument))
+            compound.text = alternative[start:position]
+
+        if compound is None:
+            raise Exception(f"Dangling combinator in {alternative!r}")
+        parts.append((combinator, compound))
+        selectors.append(Selector(parts))
+    return selectors
+
+
+def _attribute(name: str, op: str | None, value: str) -> tuple[str, str | None, object]:
+    # Jsoup's semantics: values compare case-insensitively (trimmed), `~=` is
+    # a regex searched in the value, `!=` exists and `|=` doesn't.
+    if op is None:
+        return name, op, value
+    if op == "|=":
+        raise Exception(f"Unsupported attribute operator {op} (Jsoup has no |=)")
+    if not value.strip():
+        raise Exception(f"Empty value for [{name}{op}] (Jsoup requires one)")
+    if op == "~=":
+        try:
+            return name, op, re.compile(value)
+        except re.error as e:
+            raise Exception(f"Invalid regex in [{name}~={value}]: {e}")
+    return name, op, value.strip().lower()
+
+
+def _pseudo(name: str, argument: str | None) -> tuple[str, object]:
+    match name:
+        case "first-child" | "last-child" | "only-child" | "first-of-type" | "last-of-type" | "empty" | "root":
+            return name, None
+        case "nth-child" | "nth-last-child" | "nth-of-type" | "nth-last-of-type" if argument is not None:
+            return name, _nth(argument)
+        case "eq" | "lt" | "gt" if argument is not None:
+            return name, int(argument)
+        case "not" | "has" | "is" if argument is not None:
+            return name, parse_selector(argument)
+        case "contains" | "containsown" if argument is not None:
+            return name, argument.strip().strip("\"'").lower()
+        case _:
+            raise Exception(f"Unsupported pseudo-class :{name}")
+
+
+class Matcher:
+    # Right-to-left matching like Jsoup's, counting every compound evaluation
+    # as a (rough) cost that doesn't depend on the machine.
+    def __init__(self):
+        self.checks = 0
+
+    def select(self, root: Node, selectors: list[Selector]) -> list[Node]:
+        return [node for node in root if any(self.matches(node, selector) for selector in selectors)]
+
+    def matches(self, node: Node, selector: Selector, index: int | None = None) -> bool:
+        index = len(selector.parts) - 1 if index is None else index
+        combinator, compound = selector.parts[index]
+        if not self.matches_compound(node, compound):
+            return False
+        if index == 0:
+            return True
+        match combinator:
+            case ">":
+                parent = node.parent
+                return parent is not None and parent.tag != "#root" and self.matches(parent, selector, index - 1)
+            case "+":
+                return node.index > 0 and self.matches(node.siblings[node.index - 1], selector, index - 1)
+            case "~":
+                return any(self.matches(sibling, selector, index - 1) for sibling in node.siblings[: node.index])
+            case _:
+                ancestor = node.parent
+                while ancestor is not None and ancestor.tag != "#root":
+                    if self.matches(ancestor, selector, index - 1):
+                        return True
+                    ancestor = ancestor.parent
+                return False
+
+    def matches_compound(self, node: Node, compound: Compound) -> bool:
+        self.checks += 1
+        if compound.tag is not None and node.tag != compound.tag:
+            return False
+        if compound.id is not None and node.attrs.get("id") != compound.id:
+            return False
+        if any(cls not in node.classes for cls in compound.classes):
+            return False
+        for name, op, value in compound.attrs:
+            actual = node.attrs.get(name)
+            if actual is None and op != "!=":
+                return False
+            if not _attribute_matches(actual or "", op, value):
+                return False
+        return all(self.matches_pseudo(node, name, argument) for name, argument in compound.pseudos)
+
+    def matches_pseudo(self, node: Node, name: str, argument) -> bool:
+        siblings = node.siblings
+        same_type = [sibling for sibling in siblings if sibling.tag == node.tag]
+        match name:
+            case "first-child":
+                return node.index == 0
+            case "last-child":
+                return node.index == len(siblings) - 1
+            case "only-child":
+                return len(siblings) == 1
+            case "first-of-type":
+                return same_type[0] is node
+            case "last-of-type":
+                return same_type[-1] is node
+            case "nth-child":
+                return _nth_matches(argument, node.index + 1)
+            case "nth-last-child":
+                return _nth_matches(argument, len(siblings) - node.index)
+            case "nth-of-type":
+                return _nth_matches(argument, same_type.index(node) + 1)
+            case "nth-last-of-type":
+                return _nth_matches(argument, len(same_type) - same_type.index(node))
+            case "eq":
+                return node.index == argument
+            case "lt":
+                return node.index < argument
+            case "gt":
+                return node.index > argument
+            case "empty":
+                return not node.children and not node.texts
+            case "root":
+                return node.parent is not None and node.parent.tag == "#root"
+            case "not":
+                return not any(self.matches(node, selector) for selector in argument)
+            case "is":
+                return any(self.matches(node, selector) for selector in argument)
+            case "has":
+                return any(self.matches(child, selector) for child in node for selector in argument)
+            case "contains":
+                return argument in node.text.lower()
+            case "containsown":
+                return argument in node.own_text.lower()
+        return False
+
+
+def _attribute_matches(actual: str, op: str | None, value) -> bool:
+    match op:
+        case None:
+            return True
+        case "=":
+            return actual.strip().lower() == value
+        case "!=":
+            return actual.strip().lower() != value
+        case "~=":
+            return value.search(actual) is not None
+        case "^=":
+            return actual.lower().startswith(value)
+        case "$=":
+            return actual.lower().endswith(value)
+        case "*=":
+            return value in actual.lower()
+    return False
+
+
+def _nth_matches(nth: tuple[int, int], position: int) -> bool:
+    a, b = nth
+    if a == 0:
+        return position == b
+    return (position - b) % a == 0 and (position - b) // a >= 0
+
+
+def _is_bare(compound: Compound, *tags: str) -> bool:
+    return compound.tag in tags and not (compound.id or compound.classes or compound.attrs or compound.pseudos)
+
+
+def page_of(key: str) -> str:
+    # The fixture a selector runs against: popular_next -> popular.
+    return key.removesuffix("_next")
+
+
+@dataclass
+class SelectorReport:
+    key: str
+    css: str
+    matches: dict[str, int] = field(default_factory=dict)
+    checks: int = 0
+    seconds: float = 0.0
+    error: str | None = None
+    suggestion: str | None = None
+    suggestion_checks: int = 0
+    notes: list[str] = field(default_factory=list)
+
+    @property
+    def failed(self) -> bool:
+        # Next page selectors may rightfully match nothing (last page).
+        return self.error is None and not any(self.matches.values()) and not self.key.endswith("_next")
+
+
+class SelectorAnalyzer:
+    def __init__(self, fixtures: list[tuple[str, str]], repeat: int = 10):
+        # page -> [(fixture name, document)]
+        self.fixtures: dict[str, list[tuple[str, Node]]] = {}
+        for page, path in fixtures:
+            document = parse_html(Path(path).read_text(encoding="utf-8", errors="replace"))
+            self.fixtures.setdefault(page, []).append((Path(path).name, document))
+        self.repeat = repeat
+
+    def run(self, selectors: list[Selector], documents: list[tuple[str, Node]]) -> tuple[list[list[Node]], int]:
+        matcher = Matcher()
+        results = [matcher.select(document, selectors) for _, document in documents]
+        return results, matcher.checks
+
+    def analyze(self, key: str, css: str) -> SelectorReport:
+        report = SelectorReport(key, css)
+        documents = self.fixtures.get(page_of(key), [])
+        if not documents:
+            report.error = f"no fixture for {page_of(key)!r}"
+            return report
+        try:
+            selectors = parse_selector(css)
+        except Exception as e:
+            report.error = str(e)
+            return report
+
+        results, report.checks = self.run(selectors, documents)
+        report.matches = {name: len(nodes) for (name, _), nodes in zip(documents, results)}
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            self.run(selectors, documents)
+            timings.append(time.perf_counter() - start)
+        report.seconds = min(timings)
+
+        for selector in selectors:
+            compound = selector.parts[-1][1]
+            if compound.tag and _is_bare(compound, compound.tag):
+                report.notes.append(
+                    f"the rightmost part ({compound.text}) only checks the tag, every <{compound.tag}> walks up the tree"
+                )
+        if any(results):
+            self.suggest(report, selectors, documents, results)
+        return report
+
+    def suggest(self, report: SelectorReport, selectors: list[Selector], documents, expected):
+        # Cheaper selectors that select exactly the same elements on every fixture.
+        def same(candidate: list[Selector]) -> bool:
+            results, _ = self.run(candidate, documents)
+            return all(
+                [id(node) for node in got] == [id(node) for node in want]
+                for got, want in zip(results, expected)
+            )
+
+        candidate = [Selector(list(selector.parts)) for selector in selectors]
+        for selector in candidate:
+            # Leading html/body parts match every element, they only cost ancestor walks.
+            while len(selector.parts) > 1 and selector.parts[1][0] == " " and _is_bare(selector.parts[0][1], "html", "body"):
+                selector.parts = [(None, selector.parts[1][1]), *selector.parts[2:]]
+            # Descendant chains whose matches are always direct children.
+            for index, (combinator, compound) in enumerate(selector.parts):
+                if combinator == " ":
+                    selector.parts[index] = (">", compound)
+                    if not same(candidate):
+                        selector.parts[index] = (" ", compound)
+
+        suggestion = ", ".join(map(str, candidate))
+        _, checks = self.run(candidate, documents)
+        if suggestion != ", ".join(map(str, selectors)) and checks < report.checks:
+            report.suggestion, report.suggestion_checks = suggestion, checks
+
+    def analyze_all(self, selectors: dict[str, str]) -> list[SelectorReport]:
+        unknown = set(selectors) - SELECTORS.keys()
+        if unknown:
+            raise Exception(f"Unknown selectors: {', '.join(sorted(unknown))} (expected one of {', '.join(SELECTORS)})")
+        return [self.analyze(key, selectors[key]) for key in SELECTORS if key in selectors]
@@ -0,0 +1,158 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from batch import scaffolder_from_row
+from lockfile import get_lockfile
+from options import ScaffoldOptions
+from repo_index import get_repo_index
+from theme_index import get_theme_index
+from writer import IncrementalWriter
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+SCAFFOLD_ERROR = -32000
+
+
+class ScaffoldServer:
+    # JSON-RPC 2.0 over newline-delimited JSON. Theme data and compiled
+    # templates live in module-level caches, so they stay warm between calls.
+    def __init__(self, jobs: int | None = None, repo_root: str | Path = "."):
+        self.executor = ThreadPoolExecutor(jobs)
+        # Used by the requests without their own repo_root.
+        self.repo_root = repo_root
+        self.methods = {
+            "ping": self.ping,
+            "plan": self.plan,
+            "scaffold": self.scaffold,
+            "refresh": self.refresh,
+        }
+
+    def ping(self, params: dict) -> str:
+        return "pong"
+
+    def scaffolder(self, params: dict):
+        options = ScaffoldOptions.from_dict(params.get("options") or {})
+        return scaffolder_from_row(params, options, params.get("repo_root") or self.repo_root)
+
+    def plan(self, params: dict) -> dict:
+        scaffold = self.scaffolder(params)
+        return {
+            "package_path": scaffold.package_path,
+            "dirs": list(scaffold.dirs),
+            "files": [{"path": path, "content": content} for path, content in scaffold.plan()],
+        }
+
+    def scaffold(self, params: dict) -> dict:
+        scaffold = self.scaffolder(params)
+        writer = IncrementalWriter(verbose=False, dry_run=bool(params.get("dry_run")), root=scaffold.repo_root)
+        scaffold.create_dirs(writer, bool(params.get("force")))
+        files = scaffold.create_files(writer=writer)
+        get_lockfile(scaffold.repo_root).flush()
+        return {
+            "package_path": scaffold.package_path,
+            "files": files,
+            "report": vars(writer.report),
+        }
+
+    def refresh(self, params: dict) -> dict:
+        root = params.get("repo_root") or self.repo_root
+        return {
+            "themes": len(get_theme_index(root).refresh()),
+            "extensions": len(get_repo_index(root).refresh()),
+        }
+
+    def handle(self, line: str) -> dict | None:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return self.error(None, PARSE_ERROR, f"Parse error: {e}")
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return self.error(None, INVALID_REQUEST, "Invalid request")
+
+        request_id = request.get("id")
+        # Requests without an id are notifications: never answered, not even with an error.
+        notification = "id" not in request
+        method = self.methods.get(request["method"])
+        if method is None:
+            return self.error(request_id, METHOD_NOT_FOUND, f"Method not found: {request['method']}", notification)
+
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            return self.error(request_id, INVALID_REQUEST, "Only named params are supported", notification)
+        try:
+            result = method({key.replace("-", "_"): value for key, value in params.items()})
+        except Exception as e:
+            return self.error(request_id, SCAFFOLD_ERROR, str(e) or e.__class__.__name__, notification)
+        if notification:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def error(self, request_id, code: int, message: str, notification: bool = False) -> dict | None:
+        if notification:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    def serve_stdio(self):
+        lock = threading.Lock()
+        stdout = sys.stdout
+
+        def respond(line: str):
+            response = self.handle(line)
+            if response is not None:
+                with lock:
+                    stdout.write(json.dumps(response) + "\n")
+                    stdout.flush()
+
+        for line in sys.stdin:
+            if line.strip():
+                self.executor.submit(respond, line)
+        self.executor.shutdown()
+
+    def serve_unix(self, path: str):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+
+                def respond(line: bytes):
+                    response = server.handle(line.decode("utf-8"))
+                    if response is not None:
+                        with lock:
+                            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+                pending = [server.executor.submit(respond, line) for line in self.rfile if line.strip()]
+                for future in pending:
+                    future.result()
+
+        remove_stale_socket(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix_server:
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.unlink(path)
+
+
+def remove_stale_socket(path: str):
+    # Only a socket left behind by a server that is gone, never another file.
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise Exception(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise Exception(f"Another server is listening on {path}")
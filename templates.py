@@ -0,0 +1,73 @@
+import copy
+import re
+import threading
+from collections import OrderedDict
+
+# Placeholder written in place of each slot value while compiling a template.
+_SLOT = re.compile("\x00(\\d+)\x00")
+
+# Compiled variants kept per template, least recently used first out. The
+# variant holds the options (sample responses, selectors, hosts...), so a
+# long-lived server would otherwise keep every variant it ever rendered.
+MAX_VARIANTS = 64
+
+
+class CompiledTemplate:
+    def __init__(self, text: str, slots: tuple[str, ...]):
+        parts = _SLOT.split(text)
+        self.fragments = parts[0::2]
+        self.slots = tuple(slots[int(index)] for index in parts[1::2])
+
+    def render(self, source) -> str:
+        output = [self.fragments[0]]
+        for slot, fragment in zip(self.slots, self.fragments[1:]):
+            output.append(getattr(source, slot))
+            output.append(fragment)
+        return "".join(output)
+
+
+# Read-only property for generated files. The decorated function only runs
+# once per scaffolder class and `template_variant`, against a copy of the
+# scaffolder whose `template_slots` hold placeholders, so dedent, replaces and
+# nested templates are all done at compile time and rendering a source is just
+# a join of the compiled fragments with its slot values.
+class template:
+    def __init__(self, fget):
+        self.fget = fget
+        self.__doc__ = fget.__doc__
+        self.compiled: OrderedDict[tuple, CompiledTemplate] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if not instance.timing_hooks:
+            return self.render(instance)
+        with instance.timed("template", name=self.name) as event:
+            event["compiled"] = (type(instance), instance.template_variant) not in self.compiled
+            return self.render(instance)
+
+    def render(self, instance) -> str:
+        key = (type(instance), instance.template_variant)
+        with self.lock:
+            compiled = self.compiled.get(key)
+            if compiled is not None:
+                self.compiled.move_to_end(key)
+        if compiled is None:
+            compiled = self.compile(instance)
+            with self.lock:
+                self.compiled[key] = compiled
+                while len(self.compiled) > MAX_VARIANTS:
+                    self.compiled.popitem(last=False)
+        return compiled.render(instance)
+
+    def compile(self, instance) -> CompiledTemplate:
+        slots = instance.template_slots
+        stub = copy.copy(instance)
+        for index, slot in enumerate(slots):
+            if isinstance(getattr(instance, slot), str):
+                setattr(stub, slot, f"\x00{index}\x00")
+        return CompiledTemplate(self.fget(stub), slots)
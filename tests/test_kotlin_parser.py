@@ -0,0 +1,78 @@
+from kotlin_parser import parse_arguments, parse_class, parse_constructor
+
+THEME = """
+package eu.kanade.tachiyomi.multisrc.dooplay
+
+import eu.kanade.tachiyomi.animesource.model.SAnime
+import java.text.SimpleDateFormat
+import java.util.Locale
+
+abstract class DooPlay<T : Any>(
+    @Suppress("unused") override val lang: String,
+    override val name: String,
+    protected open val baseUrl: String,
+    private val headers: Map<String, List<Pair<String, Int>>> = mapOf("a" to listOf("b" to 1, "c" to 2)),
+    private val dateFormat: SimpleDateFormat = SimpleDateFormat("MMMM dd, yyyy", Locale.US),
+    val sorter: (String, Int) -> Boolean = { a, b -> a.length > b },
+    vararg val extras: String,
+) : ParsedAnimeHttpSource(), ConfigurableAnimeSource {
+    @Deprecated("old")
+    protected open val prefQualityValues: Array<String> = arrayOf("1080p", "720p")
+
+    protected abstract fun animeFromElement(element: Element): SAnime
+
+    protected open fun <R> Map<String, List<R>>.firstOf(key: String, default: () -> R = { error("none") }): R {
+        return get(key)?.firstOrNull() ?: default()
+    }
+
+    init {
+        val ignored = listOf<Pair<Int, Int>>()
+    }
+}
+"""
+
+
+def test_constructor_with_nested_generics_lambdas_and_annotations():
+    parameters = parse_constructor("DooPlay", THEME)
+    assert [parameter.name for parameter in parameters] == [
+        "lang", "name", "baseUrl", "headers", "dateFormat", "sorter", "extras",
+    ]
+    lang, _, base_url, headers, date_format, sorter, extras = parameters
+    assert lang.modifiers == ("override",) and lang.binding == "val"
+    assert base_url.visibility == "protected" and not base_url.is_optional
+    assert headers.type == "Map<String, List<Pair<String, Int>>>"
+    assert headers.default == 'mapOf("a" to listOf("b" to 1, "c" to 2))'
+    assert date_format.default == 'SimpleDateFormat("MMMM dd, yyyy", Locale.US)'
+    assert sorter.type == "(String, Int) -> Boolean"
+    assert sorter.default == "{ a, b -> a.length > b }"
+    assert extras.modifiers == ("vararg",) and extras.is_optional is False
+
+
+def test_class_superclass_and_members():
+    info = parse_class("DooPlay", THEME)
+    assert info.superclass == "ParsedAnimeHttpSource"
+    members = {member.name: member for member in info.members}
+    assert set(members) == {"prefQualityValues", "animeFromElement", "firstOf"}
+    assert members["animeFromElement"].is_abstract
+    assert members["animeFromElement"].declaration == "fun animeFromElement(element: Element): SAnime"
+    assert members["animeFromElement"].imports == ("eu.kanade.tachiyomi.animesource.model.SAnime",)
+    # Default values are dropped from the override declaration.
+    assert members["firstOf"].declaration == "fun <R> Map<String, List<R>>.firstOf(key: String, default: () -> R): R"
+    assert members["prefQualityValues"].declaration == "val prefQualityValues: Array<String>"
+
+
+def test_missing_class():
+    assert parse_constructor("Other", THEME) is None
+    assert parse_class("Other", THEME) is None
+
+
+def test_call_arguments():
+    arguments = parse_arguments('"Name", baseUrl = "https://a.com", headers = mapOf("x" to listOf(1, 2)), { it == 1 }')
+    assert arguments == [
+        (None, '"Name"'),
+        ("baseUrl", '"https://a.com"'),
+        ("headers", 'mapOf("x" to listOf(1, 2))'),
+        (None, "{ it == 1 }"),
+    ]
+    assert parse_arguments("a == b") == [(None, "a == b")]
+    assert parse_arguments("") == []
@@ -0,0 +1,72 @@
+from textwrap import dedent
+
+from reconcile import merge_regions
+
+RENDERED = dedent(
+    """
+    package eu.kanade.tachiyomi.animeextension.en.source
+
+    import eu.kanade.tachiyomi.network.GET
+    import okhttp3.Request
+    import okhttp3.Response
+
+    class Source : AnimeHttpSource() {
+        // region scaffolder:popular
+        override fun popularAnimeRequest(page: Int): Request = GET("$baseUrl/popular/$page")
+
+        override fun popularAnimeParse(response: Response) = parsePage(response)
+        // endregion
+
+        override fun latestUpdatesRequest(page: Int): Request = throw UnsupportedOperationException()
+    }
+    """
+)
+
+EDITED = dedent(
+    """
+    package eu.kanade.tachiyomi.animeextension.en.source
+
+    import eu.kanade.tachiyomi.network.GET
+    import okhttp3.Request
+
+    // Hand-written note.
+    class Source : AnimeHttpSource() {
+        // region scaffolder:popular
+        override fun popularAnimeRequest(page: Int): Request = GET("$baseUrl/old/$page")
+        // endregion
+
+        override fun latestUpdatesRequest(page: Int): Request = GET("$baseUrl/latest/$page")
+
+        private fun helper() = "kept"
+    }
+    """
+)
+
+
+def test_regions_are_replaced_and_hand_edits_kept():
+    merged = merge_regions(EDITED, RENDERED)
+    assert 'GET("$baseUrl/popular/$page")' in merged
+    assert "popularAnimeParse" in merged
+    assert "/old/" not in merged
+    # Outside the regions, the file is left as it was edited.
+    assert "// Hand-written note." in merged
+    assert 'GET("$baseUrl/latest/$page")' in merged
+    assert 'private fun helper() = "kept"' in merged
+    assert "throw UnsupportedOperationException()" not in merged
+
+
+def test_missing_imports_are_merged_in_order():
+    merged = merge_regions(EDITED, RENDERED)
+    assert merged.count("import ") == 3
+    assert "import eu.kanade.tachiyomi.network.GET\nimport okhttp3.Request\nimport okhttp3.Response\n" in merged
+
+
+def test_regions_removed_from_the_render_are_dropped():
+    rendered = RENDERED.replace("// region scaffolder:popular", "// region scaffolder:latest")
+    merged = merge_regions(EDITED, rendered)
+    assert "popularAnimeRequest" not in merged
+    assert "// Hand-written note." in merged
+
+
+def test_unchanged_file_is_kept():
+    assert merge_regions(RENDERED, RENDERED) == RENDERED
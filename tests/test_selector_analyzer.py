@@ -0,0 +1,66 @@
+import pytest
+
+from selector_analyzer import Matcher, SelectorAnalyzer, parse_html, parse_selector
+
+TABLE = """
+<table class="eps">
+  <tr><td><a href="/ep/1">Episode 1</a><td>2024
+  <tr><td><a href="/ep/2">Episode 2</a><td>2024
+</table>
+"""
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    fixture = tmp_path / "episodes.html"
+    fixture.write_text(TABLE, encoding="utf-8")
+    return SelectorAnalyzer([("episodes", str(fixture))], repeat=1)
+
+
+def test_cells_stay_inside_their_row():
+    table = next(node for node in parse_html(TABLE) if node.tag == "table")
+    assert [node.tag for node in table.children] == ["tbody"]
+    rows = table.children[0].children
+    assert [node.tag for node in rows] == ["tr", "tr"]
+    assert [[cell.tag for cell in row.children] for row in rows] == [["td", "td"], ["td", "td"]]
+
+
+def test_descendant_selector_matches_links_in_rows(analyzer):
+    (report,) = analyzer.analyze_all({"episodes": "table.eps tr a"})
+    assert report.matches == {"episodes.html": 2}
+    assert not report.failed
+
+
+def test_child_selector_needs_the_implicit_tbody(analyzer):
+    (report,) = analyzer.analyze_all({"episodes": "table.eps > tbody > tr"})
+    assert report.matches == {"episodes.html": 2}
+    (report,) = analyzer.analyze_all({"episodes": "table.eps > tr"})
+    assert report.failed
+
+
+def test_unknown_selectors_are_rejected(analyzer):
+    with pytest.raises(Exception, match="Unknown selectors: bogus"):
+        analyzer.analyze_all({"episodes": "tr", "bogus": "a"})
+
+
+def test_fragments_get_the_document_skeleton():
+    document = parse_html("<title>Eps</title><div class='list'><a href='/ep/1'>1</a></div>")
+    (html,) = document.children
+    assert [node.tag for node in html.children] == ["head", "body"]
+    assert [node.tag for node in html.children[0].children] == ["title"]
+    assert [node.tag for node in html.children[1].children] == ["div"]
+
+
+def test_attribute_operators_follow_jsoup():
+    document = parse_html('<a href="/Episode/12" class="Ep">12</a><a href="/movie/1">1</a>')
+
+    def select(css):
+        return [node.attrs["href"] for node in Matcher().select(document, parse_selector(css))]
+
+    assert select(r"a[href~=/episode/\d+]") == []
+    assert select(r"a[href~=/Episode/\d+]") == ["/Episode/12"]
+    assert select("a[href^=/episode]") == ["/Episode/12"]
+    assert select("a[href!=/movie/1]") == ["/Episode/12"]
+    assert select("body > a.ep") == ["/Episode/12"]
+    with pytest.raises(Exception, match=r"\|="):
+        parse_selector("a[lang|=en]")
@@ -0,0 +1,54 @@
+import pytest
+
+import templates
+from animesource_scaffolder import AnimeSourceScaffolder
+from mangasource_scaffolder import MangaSourceScaffolder
+from options import ScaffoldOptions
+from templates import template
+
+VARIANTS = [
+    (False, ScaffoldOptions()),
+    (True, ScaffoldOptions()),
+    (False, ScaffoldOptions(rate_limit="strict", cdn_hosts=("cdn.example.com",))),
+    (True, ScaffoldOptions(paginated_episodes=True, page_concurrency=2, details_cache=16)),
+]
+SOURCES = [
+    ("Source One", "en", "https://one.com"),
+    ("Fonte Dois!", "pt-BR", "https://dois.com.br"),
+    ("Multi", "all", "https://multi.org"),
+]
+
+
+def templates_of(scaffolder) -> dict[str, template]:
+    found = {}
+    for cls in reversed(scaffolder.mro()):
+        found |= {name: value for name, value in vars(cls).items() if isinstance(value, template)}
+    return found
+
+
+@pytest.mark.parametrize("scaffolder", [AnimeSourceScaffolder, MangaSourceScaffolder])
+@pytest.mark.parametrize("is_parsed, options", VARIANTS)
+def test_cached_render_matches_a_fresh_render(tmp_path, scaffolder, is_parsed, options):
+    sources = [scaffolder(is_parsed, *source, options=options, repo_root=tmp_path) for source in SOURCES]
+    for name, prop in templates_of(scaffolder).items():
+        # The first source compiles the variant, the others reuse it.
+        for source in sources:
+            assert getattr(source, name) == prop.fget(source), name
+
+
+def test_cache_keeps_the_most_recently_used_variants(tmp_path, monkeypatch):
+    monkeypatch.setattr(templates, "MAX_VARIANTS", 2)
+    prop = templates_of(AnimeSourceScaffolder)["build_gradle"]
+    prop.compiled.clear()
+    sources = [
+        AnimeSourceScaffolder(
+            False, "Source", "en", "https://a.com", options=ScaffoldOptions(page_concurrency=index), repo_root=tmp_path
+        )
+        for index in (1, 2, 3)
+    ]
+    for source in (sources[0], sources[1], sources[0], sources[2]):
+        assert source.build_gradle == prop.fget(source)
+    assert list(prop.compiled) == [
+        (AnimeSourceScaffolder, sources[0].template_variant),
+        (AnimeSourceScaffolder, sources[2].template_variant),
+    ]
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable
+
+from kotlin_parser import ClassInfo, Member, Parameter, parse_class, parse_constructor
+from writer import write_atomic
+
+CACHE_FILE = "build/scaffolder/theme-index.json"
+CACHE_VERSION = 4
+
+
+@dataclass
+class ThemeEntry:
+    name: str
+    package: str
+    path: str
+    mtime_ns: int
+    size: int
+    sha1: str
+    # Primary constructor, None when the class couldn't be parsed (see error).
+    parameters: list[Parameter] | None
+    superclass: str | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ThemeEntry":
+        parameters = data["parameters"]
+        if parameters is not None:
+            parameters = [
+                Parameter(**{**parameter, "modifiers": tuple(parameter["modifiers"])})
+                for parameter in parameters
+            ]
+        return cls(**{**data, "parameters": parameters})
+
+
+def find_class(class_name: str, class_body: str, members: bool = True) -> ClassInfo:
+    info = parse_class(class_name, class_body, members)
+    if info is None:
+        raise Exception(f"class {class_name} is not declared in its file")
+    return info
+
+
+def find_class_parameters(class_name: str, class_body: str) -> list[Parameter]:
+    parameters = parse_constructor(class_name, class_body)
+    if parameters is None:
+        raise Exception(f"class {class_name} is not declared in its file")
+    return parameters
+
+
+class ThemeIndex:
+    def __init__(self, root: str | Path = "."):
+        self.root = Path(root)
+        self.cache_path = self.root / CACHE_FILE
+        self.themes: dict[str, ThemeEntry] = {}
+        # Memoized per refresh, shared by every source using the theme. Members
+        # are only read for the themes a source uses, and aren't cached on disk,
+        # so the index itself stays as cheap as the constructors.
+        self.members: dict[str, list[Member]] = {}
+        self.abstract: dict[str, list[Member]] = {}
+        # Refreshed by the watcher while threads (scaffold_many, the server) read it.
+        self.lock = threading.RLock()
+
+    def __contains__(self, theme: str) -> bool:
+        return theme in self.themes
+
+    def __len__(self) -> int:
+        return len(self.themes)
+
+    def get(self, theme: str) -> ThemeEntry | None:
+        return self.themes.get(theme)
+
+    def theme_files(self):
+        # lib-multisrc/<pkg>/src/eu/kanade/tachiyomi/multisrc/<pkg>/<Theme>.kt
+        multisrc = self.root / "lib-multisrc"
+        if not multisrc.is_dir():
+            return
+        for lib in os.scandir(multisrc):
+            theme_dir = Path(lib.path, "src/eu/kanade/tachiyomi/multisrc", lib.name)
+            if not lib.is_dir() or not theme_dir.is_dir():
+                continue
+            for file in os.scandir(theme_dir):
+                name, ext = os.path.splitext(file.name)
+                if ext == ".kt" and name.lower() == lib.name and file.is_file():
+                    yield lib.name, name, Path(file.path)
+
+    def load(self) -> dict[str, ThemeEntry]:
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            if data.get("version") != CACHE_VERSION:
+                return {}
+            return {name: ThemeEntry.from_dict(entry) for name, entry in data["themes"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def save(self):
+        data = {
+            "version": CACHE_VERSION,
+            "themes": {name: asdict(entry) for name, entry in sorted(self.themes.items())},
+        }
+        write_atomic(self.cache_path, json.dumps(data).encode("utf-8"))
+
+    def read_entry(self, package: str, name: str, path: Path, entry: ThemeEntry | None) -> ThemeEntry:
+        # The cached entry when the file didn't change, a new one otherwise.
+        stat = path.stat()
+        relpath = path.relative_to(self.root).as_posix()
+        if (
+            entry is not None
+            and entry.path == relpath
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+        ):
+            return entry
+
+        content = path.read_bytes()
+        sha1 = hashlib.sha1(content).hexdigest()
+        if entry is not None and entry.path == relpath and entry.sha1 == sha1:
+            # Touched but not modified, only the stat info is stale.
+            entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+            return entry
+
+        try:
+            info, error = find_class(name, content.decode("utf-8"), members=False), None
+        except Exception as e:
+            # Only fails the sources using this theme.
+            info, error = ClassInfo(name, None, None, []), str(e)
+        return ThemeEntry(
+            name=name,
+            package=package,
+            path=relpath,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha1=sha1,
+            parameters=info.parameters,
+            superclass=info.superclass,
+            error=error,
+        )
+
+    def refresh(self) -> "ThemeIndex":
+        with self.lock:
+            cached = self.themes or self.load()
+            themes: dict[str, ThemeEntry] = {}
+            dirty = False
+            for package, name, path in self.theme_files():
+                entry = cached.get(name)
+                stamp = None if entry is None else (entry.mtime_ns, entry.size)
+                themes[name] = self.read_entry(package, name, path, entry)
+                dirty |= themes[name] is not entry or stamp != (entry.mtime_ns, entry.size)
+
+            self.themes = themes
+            self.members = {name: members for name, members in self.members.items() if themes.get(name) is cached.get(name)}
+            self.abstract = {}
+            if dirty or themes.keys() != cached.keys():
+                self.try_save()
+            return self
+
+    def try_save(self):
+        try:
+            self.save()
+        except OSError:
+            pass  # The cache is only an optimization.
+
+    def theme_of(self, path: Path) -> tuple[str, str] | None:
+        # (package, name) when path is lib-multisrc/<pkg>/src/eu/kanade/tachiyomi/multisrc/<pkg>/<Theme>.kt
+        try:
+            parts = path.relative_to(self.root).parts
+        except ValueError:
+            return None
+        if len(parts) != 9 or parts[0] != "lib-multisrc" or parts[2:7] != ("src", "eu", "kanade", "tachiyomi", "multisrc"):
+            return None
+        package, (name, ext) = parts[1], os.path.splitext(parts[8])
+        if parts[7] != package or ext != ".kt" or name.lower() != package:
+            return None
+        return package, name
+
+    def update(self, paths: Iterable[Path]) -> set[str]:
+        # Only re-reads the given files (e.g. reported by a watcher) instead of
+        # scanning lib-multisrc, returns the themes whose entry changed.
+        with self.lock:
+            changed = set()
+            for path in paths:
+                theme = self.theme_of(self.root / path)
+                if theme is None:
+                    continue
+                package, name = theme
+                entry = self.themes.get(name)
+                if not (self.root / path).is_file():
+                    if entry is not None and entry.package == package:
+                        del self.themes[name]
+                        self.members.pop(name, None)
+                        changed.add(name)
+                    continue
+                stamp = None if entry is None else (entry.mtime_ns, entry.size, entry.sha1)
+                self.themes[name] = self.read_entry(package, name, self.root / path, entry)
+                if self.themes[name] is not entry:
+                    self.members.pop(name, None)
+                    changed.add(name)
+                elif stamp != (entry.mtime_ns, entry.size, entry.sha1):
+                    self.try_save()
+            if changed:
+                self.abstract = {}
+                self.try_save()
+            return changed
+
+    def hierarchy(self, theme: str) -> list[ThemeEntry]:
+        # The theme and its parent themes, up to the first non-theme superclass.
+        chain = []
+        entry = self.themes.get(theme)
+        while entry is not None and entry not in chain:
+            chain.append(entry)
+            entry = self.themes.get(entry.superclass) if entry.superclass else None
+        return chain
+
+    def declares(self, theme: str, key: tuple) -> bool:
+        # Whether the member is declared (abstract or not) somewhere in the chain.
+        return any(member.key == key for entry in self.hierarchy(theme) for member in self.members_of(entry))
+
+    def members_of(self, entry: ThemeEntry) -> list[Member]:
+        with self.lock:
+            if entry.name not in self.members:
+                try:
+                    content = (self.root / entry.path).read_text(encoding="utf-8")
+                    self.members[entry.name] = find_class(entry.name, content).members
+                except Exception:
+                    # Unreadable since it was indexed, as if it declared nothing.
+                    self.members[entry.name] = []
+            return self.members[entry.name]
+
+    def abstract_members(self, theme: str) -> list[Member]:
+        # Members declared abstract somewhere in the chain and not implemented below.
+        with self.lock:
+            if theme not in self.abstract:
+                members: dict[tuple, Member] = {}
+                for entry in reversed(self.hierarchy(theme)):
+                    for member in self.members_of(entry):
+                        if member.is_abstract:
+                            members[member.key] = member
+                        else:
+                            members.pop(member.key, None)
+                self.abstract[theme] = list(members.values())
+            return self.abstract[theme]
+
+
+_indexes: dict[Path, ThemeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_theme_index(root: str | Path = ".") -> ThemeIndex:
+    key = Path(root).resolve()
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = ThemeIndex(key).refresh()
+        return _indexes[key]
@@ -0,0 +1,26 @@
+import re
+from functools import cache
+from typing import Iterable
+
+
+class Translator:
+    # Applies a whole vocabulary (source-type terms, e.g. anime -> manga) in a
+    # single scan. Longer words win over their prefixes at the same position,
+    # so the result doesn't depend on the order of the vocabulary.
+    def __init__(self, vocabulary: Iterable[tuple[str, str]]):
+        self.vocabulary = dict(vocabulary)
+        words = sorted(self.vocabulary, key=lambda word: (-len(word), word))
+        self.pattern = re.compile("|".join(map(re.escape, words))) if words else None
+
+    def extend(self, vocabulary: Iterable[tuple[str, str]]) -> "Translator":
+        return Translator((*self.vocabulary.items(), *vocabulary))
+
+    def __call__(self, text: str) -> str:
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda match: self.vocabulary[match.group(0)], text)
+
+
+@cache
+def get_translator(vocabulary: tuple[tuple[str, str], ...]) -> Translator:
+    return Translator(vocabulary)
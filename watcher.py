@@ -0,0 +1,287 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import select
+import struct
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from animesource_scaffolder import AnimeSourceScaffolder
+from kotlin_parser import Parameter, group_end, parse_arguments
+from mangasource_scaffolder import MangaSourceScaffolder
+from repo_index import get_repo_index
+from theme_index import ThemeIndex, get_theme_index
+from writer import IncrementalWriter, write_atomic
+
+# The theme signatures the watcher last applied. Kept apart from the theme
+# index cache, which every themed scaffold refreshes.
+STATE_FILE = "build/scaffolder/watch-state.json"
+STATE_VERSION = 1
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+_VERSION_CODE = re.compile(r"(overrideVersionCode\s*=\s*)(\d+)")
+
+
+class InotifyWatcher:
+    # Watches every directory of lib-multisrc, so a change costs one event
+    # instead of a scan of all the themes.
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, root: Path, debounce: float = 0.2):
+        self.debounce = debounce
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: dict[int, Path] = {}
+        self.add_tree(root / "lib-multisrc")
+
+    def add_tree(self, directory: Path):
+        for path, _, _ in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+            if wd >= 0:
+                self.dirs[wd] = Path(path)
+
+    def read(self) -> set[Path]:
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if not mask & IN_ISDIR:
+                changed.add(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                # A new (or moved in) theme directory.
+                self.add_tree(path)
+                changed.update(path.rglob("*.kt"))
+        return changed
+
+    def changes(self) -> Iterator[set[Path]]:
+        while True:
+            select.select([self.fd], [], [])
+            changed = set()
+            # Editors and git write in several steps, wait for the whole burst.
+            while select.select([self.fd], [], [], self.debounce)[0]:
+                changed |= self.read()
+            yield changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # Fallback when inotify isn't available: compares the stat of the theme
+    # files every `interval` seconds.
+    def __init__(self, index: ThemeIndex, interval: float = 1.0):
+        self.index = index
+        self.interval = interval
+
+    def snapshot(self) -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+        for _, _, path in self.index.theme_files():
+            stat = path.stat()
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self) -> Iterator[set[Path]]:
+        previous = self.snapshot()
+        while True:
+            time.sleep(self.interval)
+            current = self.snapshot()
+            yield {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+            previous = current
+
+    def close(self):
+        pass
+
+
+class ThemeUpdater:
+    # Keeps the themed extensions (src/*/* with a themePkg) in sync with the
+    # constructors of their themes.
+    def __init__(self, root: str | Path = ".", verbose: bool = True):
+        self.root = Path(root).resolve()
+        self.state_path = self.root / STATE_FILE
+        # The signatures of the previous run, to catch up with the changes made since.
+        self.signatures: dict[str, list[Parameter] | None] = self.load_state()
+        if not self.signatures:
+            # First run: the theme index cache is the best guess there is.
+            self.signatures = {name: entry.parameters for name, entry in ThemeIndex(self.root).load().items()}
+        self.index = get_theme_index(self.root)
+        self.writer = IncrementalWriter(verbose, root=self.root)
+        # Read once: the watcher only follows lib-multisrc.
+        self.repo = get_repo_index(self.root)
+        self.modules: dict[str, list[str]] = {}
+        for entry in self.repo.extensions.values():
+            if theme_pkg := entry.properties.get("themePkg"):
+                self.modules.setdefault(theme_pkg, []).append(entry.package_id)
+
+    def load_state(self) -> dict[str, list[Parameter] | None]:
+        try:
+            data = json.loads(self.state_path.read_text(encoding="utf-8"))
+            if data.get("version") != STATE_VERSION:
+                return {}
+            return {
+                name: None if parameters is None else [
+                    Parameter(**{**parameter, "modifiers": tuple(parameter["modifiers"])})
+                    for parameter in parameters
+                ]
+                for name, parameters in data["signatures"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def save_state(self):
+        data = {
+            "version": STATE_VERSION,
+            "signatures": {
+                name: None if parameters is None else [asdict(parameter) for parameter in parameters]
+                for name, parameters in sorted(self.signatures.items())
+            },
+        }
+        write_atomic(self.state_path, json.dumps(data).encode("utf-8"))
+
+    def catch_up(self) -> list[str]:
+        results = self.apply(self.signatures.keys() | self.index.themes.keys())
+        if not self.state_path.exists():
+            self.save_state()
+        return results
+
+    def apply(self, themes: Iterable[str]) -> list[str]:
+        results = []
+        changed = False
+        for theme in sorted(themes):
+            entry = self.index.get(theme)
+            if entry is None or entry.parameters is None:
+                continue  # Removed or unparsable: keep the last good signature.
+            old = self.signatures.get(theme)
+            self.signatures[theme] = entry.parameters
+            if old == entry.parameters:
+                continue
+            changed = True
+            if old is None:
+                continue  # A new theme, nothing uses it yet.
+            for package_id in self.modules.get(entry.package, ()):
+                try:
+                    results.append(self.update_module(package_id, theme, old, entry.parameters))
+                except Exception as e:
+                    results.append(f"FAIL {package_id}: {str(e) or e.__class__.__name__}")
+        if changed:
+            self.save_state()
+        return results
+
+    def update_module(self, package_id: str, theme: str, old: list[Parameter], new: list[Parameter]) -> str:
+        extension = self.repo.scan(package_id, self.root / self.repo.extensions[package_id].path, None)
+        lang = package_id.split(".", 1)[0]
+        class_name = (extension.ext_class or "").removesuffix("Factory")
+        module = self.root / extension.path
+        is_anime = (module / "src/eu/kanade/tachiyomi/animeextension").is_dir()
+        if lang == "all":
+            factory = module.glob(f"src/eu/kanade/tachiyomi/*/all/*/{class_name}Factory.kt")
+            text = next(factory).read_text(encoding="utf-8")
+            lang = ",".join(re.findall(rf':\s*{class_name}\("([^"]+)"\)', text))
+
+        scaffolder = AnimeSourceScaffolder if is_anime else MangaSourceScaffolder
+        scaffold = scaffolder(
+            False, extension.ext_name or "", lang, extension.properties.get("baseUrl", ""), theme, repo_root=self.root
+        )
+        if scaffold.className != class_name or scaffold.package_path != extension.path:
+            return f"SKIP {extension.path}: {class_name} doesn't match its extName"
+        source = f"{scaffold.sources_path}/{class_name}.kt"
+        text = (self.root / source).read_text(encoding="utf-8")
+        match = re.search(rf":\s*{theme}\(", text)
+        if match is None:
+            return f"SKIP {extension.path}: {class_name} doesn't call the {theme} constructor"
+        opening = match.end() - 1
+        closing = group_end(text, opening) - 1
+        arguments = call_arguments(text[opening + 1 : closing], old, scaffold.known_arguments)
+        full_lang = re.fullmatch(r'"([^"]+)"', (arguments or {}).get("lang", ""))
+        if not scaffold.is_multi_lang and full_lang:
+            # The module directory only has the short language (pt for pt-BR).
+            scaffold = scaffolder(
+                False, scaffold.name, full_lang[1], scaffold.baseUrl, theme, repo_root=self.root
+            )
+        known = scaffold.known_arguments
+        if arguments != {parameter.name: known[parameter.name] for parameter in old if parameter.name in known}:
+            return f"SKIP {extension.path}: the {theme} arguments were edited by hand"
+
+        updated = scaffold._fill_class_arguments(new)
+        if text[opening + 1 : closing] == updated:
+            return f"OK   {extension.path}: already up to date"  # Scaffolded after the change.
+
+        self.writer.write(source, text[: opening + 1] + updated + text[closing:])
+        gradle = f"{extension.path}/build.gradle"
+        gradle_text, bumped = _VERSION_CODE.subn(
+            lambda match: match[1] + str(int(match[2]) + 1), (self.root / gradle).read_text(encoding="utf-8"), 1
+        )
+        if bumped:
+            self.writer.write(gradle, gradle_text)
+        return f"OK   {extension.path}"
+
+
+def call_arguments(text: str, parameters: list[Parameter], known: dict[str, str]) -> dict[str, str] | None:
+    # Name -> value of the arguments of a generated constructor call, None if
+    # it can't have been generated for `parameters`. Older scaffolders passed
+    # the known parameters positionally (the unknown ones commented out).
+    filled = [parameter.name for parameter in parameters if parameter.name in known]
+    try:
+        parsed = parse_arguments(text)
+    except Exception:
+        return None
+    arguments = {}
+    for position, (name, value) in enumerate(parsed):
+        if name is None:
+            if position >= len(filled):
+                return None
+            name = filled[position]
+        if name in arguments:
+            return None
+        arguments[name] = value
+    return arguments
+
+
+def watch(root: str | Path = ".", poll: float | None = None, once: bool = False) -> int:
+    updater = ThemeUpdater(root)
+    for line in updater.catch_up():
+        print(line)
+    if once:
+        return 0
+
+    watcher = None
+    if poll is None and sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(updater.root)
+        except (OSError, AttributeError):
+            pass  # No inotify (or no libc), poll instead.
+    if watcher is None:
+        watcher = PollingWatcher(updater.index, poll or 1.0)
+    print(f"Watching {updater.root / 'lib-multisrc'} ({watcher.__class__.__name__})", file=sys.stderr)
+    try:
+        for changed in watcher.changes():
+            for line in updater.apply(updater.index.update(changed)):
+                print(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
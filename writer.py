@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+# Temporary files are created with 0600, new files should get the usual mode.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomic(target: Path, data: bytes, mode: int | None = None):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=target.parent, prefix=f".{target.name}.", delete=False
+    ) as f:
+        f.write(data)
+    try:
+        os.chmod(f.name, 0o666 & ~_UMASK if mode is None else mode)
+        os.replace(f.name, target)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+@dataclass
+class WriteReport:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Nothing was actually written.
+    dry_run: bool = False
+
+    def __str__(self) -> str:
+        if self.dry_run:
+            return f"{self.created} would be created, {self.updated} would be updated, {self.unchanged} unchanged."
+        return f"{self.created} created, {self.updated} updated, {self.unchanged} unchanged."
+
+
+class Writer:
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose
+        self.report = WriteReport()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def persistent(self) -> bool:
+        # Whether the files end up in the repository (recorded in the lockfile).
+        return False
+
+    def mkdir(self, path: str | Path):
+        pass
+
+    def write(self, path: str | Path, content: str) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class IncrementalWriter(Writer):
+    # Only touches files whose content actually changed, so re-running the
+    # scaffolder doesn't bump mtimes (and Gradle's incremental builds).
+    def __init__(self, verbose: bool = True, dry_run: bool = False, root: str | Path | None = None):
+        super().__init__(verbose)
+        self.dry_run = dry_run
+        self.report.dry_run = dry_run
+        # Relative paths are resolved against root (the cwd when None).
+        self.root = Path(root) if root is not None else None
+
+    @property
+    def persistent(self) -> bool:
+        return not self.dry_run
+
+    def target(self, path: str | Path) -> Path:
+        return Path(path) if self.root is None else self.root / path
+
+    def mkdir(self, path: str | Path):
+        if not self.dry_run:
+            self.target(path).mkdir(parents=True, exist_ok=True)
+
+    def write(self, path: str | Path, content: str) -> str:
+        target = self.target(path)
+        data = content.encode("utf-8")
+        try:
+            stat = target.stat()
+            exists = True
+            if stat.st_size == len(data):
+                current = hashlib.sha1(target.read_bytes()).digest()
+                if current == hashlib.sha1(data).digest():
+                    self.report.unchanged += 1
+                    return "unchanged"
+        except FileNotFoundError:
+            exists = False
+
+        if self.dry_run:
+            if self.verbose:
+                print(f"Would {'update' if exists else 'create'} {path} ({len(data)} bytes)")
+        else:
+            if self.verbose:
+                print(f"{'Updating' if exists else 'Creating'} {path}")
+            write_atomic(target, data, stat.st_mode & 0o7777 if exists else None)
+
+        if exists:
+            self.report.updated += 1
+            return "would update" if self.dry_run else "updated"
+        self.report.created += 1
+        return "would create" if self.dry_run else "created"
+
+class ArchiveWriter(Writer):
+    def __init__(self, verbose: bool = True):
+        super().__init__(verbose)
+        self.mtime = int(time.time())
+        self.dirs: set[str] = set()
+
+    def mkdir(self, path: str | Path):
+        parts = [part for part in Path(path).as_posix().split("/") if part not in ("", ".")]
+        for end in range(1, len(parts) + 1):
+            directory = "/".join(parts[:end])
+            if directory not in self.dirs:
+                self.dirs.add(directory)
+                self.add_dir(directory)
+
+    def write(self, path: str | Path, content: str) -> str:
+        name = Path(path).as_posix()
+        self.mkdir(Path(name).parent)
+        if self.verbose:
+            # Archives may be streamed to stdout.
+            print(f"Adding {name}", file=sys.stderr)
+        self.add_file(name, content.encode("utf-8"))
+        self.report.created += 1
+        return "created"
+
+    def add_dir(self, name: str):
+        raise NotImplementedError
+
+    def add_file(self, name: str, data: bytes):
+        raise NotImplementedError
+
+
+class TarWriter(ArchiveWriter):
+    def __init__(self, output: str, verbose: bool = True):
+        super().__init__(verbose)
+        if output == "-":
+            self.tar = tarfile.open(fileobj=sys.stdout.buffer, mode="w|")
+        else:
+            compression = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}
+            self.tar = tarfile.open(output, "w:" + compression.get(Path(output).suffix, ""))
+
+    def add_dir(self, name: str):
+        info = tarfile.TarInfo(name)
+        info.type, info.mode, info.mtime = tarfile.DIRTYPE, 0o755, self.mtime
+        self.tar.addfile(info)
+
+    def add_file(self, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size, info.mode, info.mtime = len(data), 0o644, self.mtime
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+
+
+class ZipWriter(ArchiveWriter):
+    def __init__(self, output: str, verbose: bool = True):
+        super().__init__(verbose)
+        self.zip = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+        self.date_time = time.localtime(self.mtime)[:6]
+
+    def add_dir(self, name: str):
+        self.zip.writestr(zipfile.ZipInfo(name + "/", self.date_time), b"")
+
+    def add_file(self, name: str, data: bytes):
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self.zip.writestr(info, data)
+
+    def close(self):
+        self.zip.close()